@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.core.signals import request_finished, request_started
+
+        import api.signals  # noqa: F401
+        from foodgram.db import check_connections, mark_connections_used
+
+        request_started.connect(check_connections)
+        request_finished.connect(mark_connections_used)
@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+SHARED_CACHE_KEY = 'auth-token:{}'
+VERSION_CACHE_KEY = 'auth-token-version:{}'
+USER_EXCLUDED_FIELDS = ('password',)
+# Кеши, которые не видят другие процессы: версия токена в них ничего
+# не сообщает о выходе или изменении пользователя в другом процессе.
+LOCAL_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+class TokenCache:
+    """LRU-кеш токенов в памяти процесса с ограниченным сроком жизни."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, token = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, key, token):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_CACHE_SIZE,
+    settings.AUTH_TOKEN_CACHE_TIMEOUT
+)
+
+
+def shared_cache():
+    if not settings.AUTH_TOKEN_SHARED_CACHE:
+        return None
+    cache = caches[settings.AUTH_TOKEN_SHARED_CACHE]
+    if isinstance(cache, LOCAL_CACHE_BACKENDS):
+        return None
+    return cache
+
+
+def token_hash(key):
+    """Ключи общего кеша не содержат самого токена."""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def token_version(cache, key):
+    """Текущая версия токена из общего кеша.
+
+    Версия меняется при каждом сбросе токена. Если общий кеш
+    недоступен, возвращается None и токен читается из базы.
+    """
+    version_key = VERSION_CACHE_KEY.format(token_hash(key))
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(
+            version_key,
+            uuid.uuid4().hex,
+            settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT
+        )
+        version = cache.get(version_key)
+    return version
+
+
+def forget_tokens(keys):
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    cache = shared_cache()
+    if cache is not None and keys:
+        cache.set_many(
+            {
+                VERSION_CACHE_KEY.format(token_hash(key)): uuid.uuid4().hex
+                for key in keys
+            },
+            settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT
+        )
+
+
+def invalidate_tokens(keys):
+    """Сбрасывает токены сразу и ещё раз после фиксации транзакции.
+
+    Повторный сброс убирает токен, который параллельный запрос успел
+    прочитать из базы до фиксации.
+    """
+    keys = list(keys)
+    forget_tokens(keys)
+    transaction.on_commit(lambda: forget_tokens(keys))
+
+
+def field_values(instance, exclude=()):
+    """Значения полей для восстановления экземпляра через from_db().
+
+    Исключённые поля становятся отложенными и читаются из базы
+    при обращении.
+    """
+    return tuple(
+        (field.attname, getattr(instance, field.attname))
+        for field in instance._meta.concrete_fields
+        if field.attname not in exclude
+    )
+
+
+def from_field_values(model, db, values):
+    names, values = zip(*values)
+    return model.from_db(db, names, values)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запроса к базе на каждый запрос.
+
+    Значения полей токена и пользователя хранятся в LRU-кеше процесса
+    и в общем кеше AUTH_TOKEN_SHARED_CACHE вместе с версией токена,
+    прочитанной до запроса к базе. При каждом обращении версия
+    сверяется с общим кешем, поэтому выход, сохранение и удаление
+    пользователя действуют сразу во всех процессах. Без общего кеша
+    (не задан, LocMemCache или DummyCache) запись LRU-кеша действует
+    до истечения AUTH_TOKEN_CACHE_TIMEOUT: в своём процессе её сбрасывают
+    сигналы api.signals, в остальных изменения видны через этот срок.
+    Если общий кеш недоступен, токен читается из базы.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = shared_cache()
+        if cache is None:
+            entry = token_cache.get(key)
+            if entry is None:
+                entry = self.load_entry(key, None)
+                token_cache.set(key, entry)
+            return self.restore(entry)
+        version = token_version(cache, key)
+        if version is None:
+            return super().authenticate_credentials(key)
+        entry = token_cache.get(key)
+        if entry is None or entry['version'] != version:
+            entry = cache.get(SHARED_CACHE_KEY.format(token_hash(key)))
+            if entry is None or entry['version'] != version:
+                entry = self.load_entry(key, version)
+                cache.set(
+                    SHARED_CACHE_KEY.format(token_hash(key)),
+                    entry,
+                    settings.AUTH_TOKEN_SHARED_CACHE_TIMEOUT
+                )
+            token_cache.set(key, entry)
+        return self.restore(entry)
+
+    def load_entry(self, key, version):
+        _, token = super().authenticate_credentials(key)
+        return {
+            'version': version,
+            'db': token._state.db,
+            'token': field_values(token),
+            'user': field_values(token.user, USER_EXCLUDED_FIELDS),
+        }
+
+    def restore(self, entry):
+        # Каждый запрос получает свои экземпляры: пользователя, которого
+        # изменил один запрос, не увидят параллельные запросы.
+        token = from_field_values(Token, entry['db'], entry['token'])
+        token.user = from_field_values(User, entry['db'], entry['user'])
+        return token.user, token
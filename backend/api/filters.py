@@ -1,7 +1,15 @@
 import django_filters
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity
+)
+from django.db import connections
+from django.db.models import F, Q
 from django_filters import FilterSet, filters, widgets
 
 from recipes.models import (
+    SEARCH_CONFIG,
     Recipe,
     Tag,
     User
@@ -23,6 +31,7 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart'
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -30,15 +39,34 @@ class RecipeFilter(FilterSet):
             'tags__slug',
             'is_favorited',
             'is_in_shopping_cart',
-            'author'
+            'author',
+            'search'
         ]
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(recipe_favorites__user=self.request.user)
+            return queryset.filter(favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(recipe_cart__user=self.request.user)
+            return queryset.filter(in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с нечётким совпадением по названию."""
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = SearchQuery(
+            value,
+            config=SEARCH_CONFIG,
+            search_type='websearch'
+        )
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('name', value)
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by('-rank', '-similarity', '-pub_date')
@@ -1,24 +1,162 @@
-from typing import List
+from typing import List, Optional
 
-from rest_framework.generics import get_object_or_404
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    OuterRef,
+    Prefetch,
+    QuerySet,
+    Subquery,
+    Value
+)
 
-from recipes.models import RecipeIngredient, Ingredient, Recipe
+from recipes.models import RecipeIngredient, Recipe, Follow
+from users.models import User
 
 
 def adding_ingredients(
-        new_ingredients: List[Ingredient],
+        new_ingredients: List[dict],
         instance: Recipe
 ) -> None:
-    new_recipe_ingredients = []
-    for ingredient_data in new_ingredients:
-        ingredient = get_object_or_404(
-            Ingredient,
-            id=ingredient_data.get('id')
-        )
-        recipe_ingredient = RecipeIngredient(
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
             recipe=instance,
-            ingredient=ingredient,
+            ingredient_id=ingredient_data['id'],
             amount=ingredient_data['amount']
         )
-        new_recipe_ingredients.append(recipe_ingredient)
-    RecipeIngredient.objects.bulk_create(new_recipe_ingredients)
+        for ingredient_data in new_ingredients
+    ])
+
+
+def updating_ingredients(
+        new_ingredients: List[dict],
+        instance: Recipe
+) -> bool:
+    """Меняет только добавленные, изменённые и удалённые ингредиенты.
+
+    Возвращает True, если состав рецепта изменился.
+    """
+    current = {
+        recipe_ingredient.ingredient_id: recipe_ingredient
+        for recipe_ingredient in RecipeIngredient.objects.filter(
+            recipe=instance
+        )
+    }
+    amounts = {
+        ingredient_data['id']: ingredient_data['amount']
+        for ingredient_data in new_ingredients
+    }
+    removed = current.keys() - amounts.keys()
+    changed = []
+    for ingredient_id, recipe_ingredient in current.items():
+        amount = amounts.get(ingredient_id)
+        if amount is not None and amount != recipe_ingredient.amount:
+            recipe_ingredient.amount = amount
+            changed.append(recipe_ingredient)
+    added = [
+        ingredient_data for ingredient_data in new_ingredients
+        if ingredient_data['id'] not in current
+    ]
+    if removed:
+        RecipeIngredient.objects.filter(
+            recipe=instance,
+            ingredient_id__in=removed
+        ).delete()
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+    if added:
+        adding_ingredients(added, instance)
+    return bool(removed or changed or added)
+
+
+def adding_recipes(
+        model: type,
+        user: User,
+        recipe_ids: List[int]
+) -> List[int]:
+    """Добавляет рецепты в избранное или корзину одним INSERT.
+
+    Возвращает id рецептов, которых там ещё не было. Строка пользователя
+    блокируется до конца транзакции: параллельная вставка связи ждёт
+    блокировку ключа пользователя, поэтому прочитанное состояние верно
+    до фиксации и счётчики меняются только для вставленных строк.
+    bulk_create() минует save(), поэтому счётчики и списки покупок
+    обновляет relations_added модели.
+    """
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        existing = set(
+            model.objects.filter(
+                user=user,
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)
+        )
+        added = [
+            recipe_id for recipe_id in recipe_ids
+            if recipe_id not in existing
+        ]
+        model.objects.bulk_create(
+            [model(user=user, recipe_id=recipe_id) for recipe_id in added],
+            ignore_conflicts=True
+        )
+        model.relations_added([(user.pk, recipe_id) for recipe_id in added])
+    return added
+
+
+def removing_recipes(
+        model: type,
+        user: User,
+        recipe_ids: List[int]
+) -> List[int]:
+    """Удаляет рецепты из избранного или корзины одним DELETE.
+
+    Возвращает id рецептов, которые там были. Удаляемые строки читаются
+    с блокировкой один раз, в RelationQuerySet.remove().
+    """
+    pairs = model.objects.filter(
+        user=user,
+        recipe_id__in=recipe_ids
+    ).remove()
+    return [recipe_id for _, recipe_id in pairs]
+
+
+def authors_with_recipes(
+        queryset: QuerySet,
+        user: User,
+        recipes_limit: Optional[int] = None
+) -> QuerySet:
+    """Авторы с подпиской и последними рецептами."""
+    if user.is_anonymous:
+        subscribed = Value(False, output_field=BooleanField())
+    else:
+        subscribed = Exists(
+            Follow.objects.filter(following=OuterRef('pk'), user=user)
+        )
+    recipes = Recipe.objects.only(
+        'id',
+        'name',
+        'image',
+        'image_small',
+        'cooking_time',
+        'author_id'
+    )
+    if recipes_limit is not None:
+        recipes = recipes.filter(id__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).order_by('-pub_date').values('id')[:recipes_limit]
+        ))
+    return queryset.annotate(
+        subscribed=subscribed
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='recent_recipes')
+    )
+
+
+def get_recipes_limit(request) -> Optional[int]:
+    """Значение параметра recipes_limit из запроса."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is not None and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
@@ -0,0 +1,222 @@
+import json
+import platform
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+DEFAULT_THRESHOLD = 0.2
+# Для нулевого p95 в базовых результатах (ответ из кеша, 304) сравнивать
+# относительный рост нельзя: ухудшением считается p95 больше этого порога.
+ZERO_BASELINE_TOLERANCE_MS = 1.0
+
+
+def percentile(values, rank):
+    """Значение перцентиля методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, -(-rank * len(ordered) // 100) - 1)
+    return ordered[index]
+
+
+def get_user(username):
+    """Указанный пользователь или пользователь с наибольшим числом подписок."""
+    if username:
+        user = User.objects.filter(username=username).first()
+    else:
+        user = User.objects.annotate(
+            total_follows=Count('follows')
+        ).order_by('-total_follows', 'id').first()
+    if user is None:
+        raise CommandError(
+            'Пользователь не найден: создайте данные командой seed_data.'
+        )
+    return user
+
+
+def endpoints(user):
+    """Замеряемые запросы: имя, путь и нужна ли аутентификация."""
+    tag = Tag.objects.order_by('id').values_list('slug', flat=True).first()
+    ingredient = Ingredient.objects.order_by('id').values_list(
+        'name', flat=True
+    ).first() or ''
+    recipe = user.recipes.order_by('id').values_list('id', flat=True).first()
+    author = User.objects.filter(recipes__isnull=False).values_list(
+        'id', flat=True
+    ).first()
+    last_page = max(1, -(-Recipe.objects.count() // api_settings.PAGE_SIZE))
+    urls = [
+        ('recipes', '/api/recipes/', False),
+        ('recipes_last_page', f'/api/recipes/?page={last_page}', False),
+        ('recipes_cursor', '/api/recipes/?cursor=', False),
+        ('recipes_tags', f'/api/recipes/?tags={tag}', False),
+        ('recipes_author', f'/api/recipes/?author={author}', False),
+        ('recipes_favorited', '/api/recipes/?is_favorited=1', True),
+        ('recipes_in_cart', '/api/recipes/?is_in_shopping_cart=1', True),
+        ('recipes_search', '/api/recipes/?search=суп', False),
+        ('recipes_feed', '/api/recipes/feed/', True),
+        ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', True),
+        ('shopping_list_txt', '/api/recipes/download_shopping_cart/', True),
+        (
+            'shopping_list_pdf',
+            '/api/recipes/download_shopping_cart/?format=pdf',
+            True
+        ),
+        ('ingredients_search', f'/api/ingredients/?name={ingredient[:2]}',
+         False),
+        ('tags', '/api/tags/', False),
+    ]
+    if recipe is not None:
+        urls.append(('recipe_detail', f'/api/recipes/{recipe}/', True))
+    return urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержки (p50/p95/p99) и числа SQL-запросов '
+        'основных эндпоинтов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя; по умолчанию — с наибольшим '
+                 'числом подписок.'
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            help='Замерить только указанный эндпоинт; можно несколько раз.'
+        )
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+        parser.add_argument(
+            '--baseline',
+            help='Файл JSON с прошлыми результатами для сравнения.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help='Допустимый относительный рост p95, по умолчанию 0.2.'
+        )
+
+    def handle(self, *args, **options):
+        user = get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {
+            False: Client(),
+            True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+        }
+        selected = endpoints(user)
+        if options['only']:
+            selected = [
+                endpoint for endpoint in selected
+                if endpoint[0] in options['only']
+            ]
+        results = {}
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            for name, url, auth in selected:
+                results[name] = self.measure(
+                    clients[auth],
+                    url,
+                    options['warmup'],
+                    options['iterations']
+                )
+                self.stdout.write(self.format_row(name, results[name]))
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'user': user.username,
+            },
+            'results': results,
+        }
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps(report, ensure_ascii=False, indent=2),
+                encoding='utf-8'
+            )
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['threshold'])
+
+    def measure(self, client, url, warmup, iterations):
+        for _ in range(warmup):
+            self.request(client, url)
+        timings = []
+        queries = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                status = self.request(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context))
+        result = {
+            'url': url,
+            'status': status,
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': max(queries),
+        }
+        for rank in PERCENTILES:
+            result[f'p{rank}_ms'] = round(percentile(timings, rank), 2)
+        return result
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def format_row(self, name, result):
+        return (
+            f'{name:<22} {result["status"]:>3} '
+            f'p50 {result["p50_ms"]:>8.2f} p95 {result["p95_ms"]:>8.2f} '
+            f'p99 {result["p99_ms"]:>8.2f} мс, '
+            f'запросов {result["queries"]}'
+        )
+
+    def compare(self, report, path, threshold):
+        baseline = json.loads(Path(path).read_text(encoding='utf-8'))
+        regressions = []
+        for name, result in report['results'].items():
+            previous = baseline['results'].get(name)
+            if previous is None:
+                continue
+            more_queries = result['queries'] > previous['queries']
+            if previous['p95_ms']:
+                ratio = result['p95_ms'] / previous['p95_ms']
+                change = f'{ratio - 1:+.0%}'
+                slower = ratio > 1 + threshold
+            else:
+                change = f'{result["p95_ms"]:+.2f} мс'
+                slower = result['p95_ms'] > ZERO_BASELINE_TOLERANCE_MS
+            line = (
+                f'{name:<22} p95 {previous["p95_ms"]:.2f} -> '
+                f'{result["p95_ms"]:.2f} мс ({change}), '
+                f'запросов {previous["queries"]} -> {result["queries"]}'
+            )
+            if slower or more_queries:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f'Ухудшение относительно {path}: {", ".join(regressions)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Ухудшений не найдено.'))
@@ -0,0 +1,234 @@
+import json
+import re
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.benchmark import endpoints, get_user
+
+SQL_PREVIEW_LENGTH = 300
+SQLITE_TABLE = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(.*)$')
+SQLITE_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+POSTGRESQL_SORTS = ('Sort', 'Incremental Sort')
+POSTGRESQL_STRICT_SETTINGS = ('enable_seqscan', 'enable_sort')
+
+
+def table_sizes():
+    """Число строк в таблицах; для PostgreSQL — оценка планировщика."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+            )
+            return dict(cursor.fetchall())
+        sizes = {}
+        for table in connection.introspection.table_names(cursor):
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}'
+            )
+            sizes[table] = cursor.fetchone()[0]
+        return sizes
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def postgresql_problems(sql, sizes, min_rows, strict=False):
+    """Seq Scan по большим таблицам и сортировки больших выборок.
+
+    Чтение всей таблицы без условий, как у индекса ингредиентов,
+    проблемой не считается: индекс ему не поможет. В строгом режиме
+    проблема — любая сортировка, независимо от числа строк.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]['Plan']))
+    relations = [node for node in nodes if 'Relation Name' in node]
+    whole_table = len(relations) == 1 and 'Filter' not in relations[0]
+    problems = []
+    for node in nodes:
+        if node['Node Type'] == 'Seq Scan' and not whole_table:
+            table = node['Relation Name']
+            if sizes.get(table, 0) >= min_rows:
+                problems.append(f'Seq Scan {table}')
+        elif node['Node Type'] in POSTGRESQL_SORTS and (
+            strict or node['Plan Rows'] >= min_rows
+        ):
+            problems.append(
+                f'Sort {", ".join(node["Sort Key"])}, '
+                f'строк {node["Plan Rows"]}'
+            )
+    return problems
+
+
+def sqlite_problems(sql, sizes, min_rows, strict=False):
+    """Полный просмотр больших таблиц без индекса и сортировка в памяти.
+
+    SQLite не оценивает число сортируемых строк, поэтому сортировка
+    считается проблемой, если запрос просматривает большую таблицу
+    целиком, пусть и по индексу. Чтение всей таблицы без условий
+    проблемой не считается. Отключить выбор плана в SQLite нельзя,
+    поэтому строгий режим проверку не меняет.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+    tables = [
+        match.groups() for match in map(SQLITE_TABLE.match, details)
+        if match is not None
+    ]
+    if len(tables) == 1 and ' WHERE ' not in sql:
+        tables = []
+    problems = []
+    scanned = 0
+    for access, table, rest in tables:
+        if access != 'SCAN':
+            continue
+        scanned = max(scanned, sizes.get(table, 0))
+        if 'USING' not in rest and sizes.get(table, 0) >= min_rows:
+            problems.append(f'SCAN {table}')
+    if scanned >= min_rows and SQLITE_SORT in details:
+        problems.append(SQLITE_SORT)
+    return problems
+
+
+def capture(client, url):
+    """Уникальные SELECT-запросы, выполненные при обработке url."""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    queries = []
+    for query in context.captured_queries:
+        sql = query['sql']
+        if sql.lstrip().upper().startswith('SELECT') and (
+            sql not in queries
+        ):
+            queries.append(sql)
+    return queries
+
+
+@contextmanager
+def strict_planner():
+    """Запрещает PostgreSQL полный просмотр и сортировку, где есть индекс.
+
+    На небольшой базе планировщик законно выбирает Seq Scan и Sort.
+    С выключенными enable_seqscan и enable_sort они остаются в плане,
+    только если у запроса нет подходящего индекса.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        for name in POSTGRESQL_STRICT_SETTINGS:
+            cursor.execute(f'SET {name} = off')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name in POSTGRESQL_STRICT_SETTINGS:
+                cursor.execute(f'RESET {name}')
+
+
+def check_endpoints(user, selected, min_rows, strict=False):
+    """Проблемы в планах запросов эндпоинтов.
+
+    Возвращает для каждого эндпоинта из selected кортеж: имя, число
+    запросов и список пар (проблема, SQL).
+    """
+    if connection.vendor == 'postgresql':
+        problems_for = postgresql_problems
+    elif connection.vendor == 'sqlite':
+        problems_for = sqlite_problems
+    else:
+        raise CommandError(
+            f'Планы {connection.vendor} не поддерживаются.'
+        )
+    token, _ = Token.objects.get_or_create(user=user)
+    clients = {
+        False: Client(),
+        True: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+    }
+    sizes = table_sizes()
+    results = []
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+    ), strict_planner() if strict else nullcontext():
+        for name, url, auth in selected:
+            queries = capture(clients[auth], url)
+            found = [
+                (problem, sql)
+                for sql in queries
+                for problem in problems_for(sql, sizes, min_rows, strict)
+            ]
+            results.append((name, len(queries), found))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка планов SQL-запросов основных эндпоинтов: полный '
+        'просмотр больших таблиц и лишние сортировки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя; по умолчанию — с наибольшим '
+                 'числом подписок.'
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            help='Проверить только указанный эндпоинт; можно несколько раз.'
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=settings.EXPLAIN_MIN_ROWS,
+            help='Таблицы меньше этого числа строк не проверяются на '
+                 'полный просмотр, а без --strict и выборки — на '
+                 'сортировку. По умолчанию EXPLAIN_MIN_ROWS.'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='PostgreSQL: выключить enable_seqscan и enable_sort и '
+                 'считать проблемой любую сортировку.'
+        )
+
+    def handle(self, *args, **options):
+        user = get_user(options['user'])
+        selected = endpoints(user)
+        if options['only']:
+            selected = [
+                endpoint for endpoint in selected
+                if endpoint[0] in options['only']
+            ]
+        failed = []
+        for name, count, found in check_endpoints(
+            user, selected, options['min_rows'], options['strict']
+        ):
+            line = f'{name:<22} запросов {count}, проблем {len(found)}'
+            if found:
+                failed.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+            for problem, sql in found:
+                self.stdout.write(f'    {problem}: {sql[:SQL_PREVIEW_LENGTH]}')
+        if failed:
+            raise CommandError(
+                f'Проблемы в планах запросов: {", ".join(failed)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Проблем не найдено.'))
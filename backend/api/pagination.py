@@ -0,0 +1,128 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (pub_date, id) от новых рецептов к старым.
+
+    Каждая страница выбирается условием по индексу без OFFSET и COUNT,
+    поэтому дальние страницы стоят столько же, сколько первая.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор'
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            pub_date = parse_datetime(tokens['d'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (pub_date, pk), reverse
+
+    def encode_cursor(self, recipe, reverse):
+        tokens = {'d': recipe.pub_date.isoformat(), 'i': recipe.pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id')
+        else:
+            queryset = queryset.order_by('-pub_date', '-id')
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gte=pub_date)
+                    & (Q(pub_date__gt=pub_date) | Q(id__gt=pk))
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lte=pub_date)
+                    & (Q(pub_date__lt=pub_date) | Q(id__lt=pk))
+                )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        self.next_link = None
+        self.previous_link = None
+        if results and has_next:
+            self.next_link = self.encode_cursor(results[-1], reverse=False)
+        if results and has_previous:
+            self.previous_link = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', self.next_link),
+            ('previous', self.previous_link),
+            ('results', data)
+        ]))
+
+
+class RecipePagination(PageNumberPagination):
+    """Постраничная пагинация с режимом курсора.
+
+    Запрос с параметром cursor (в том числе пустым) переключает
+    выдачу на KeysetPagination. Курсор хранит позицию в порядке
+    (pub_date, id), поэтому выборка со своим порядком, например поиск
+    по релевантности, всегда разбивается на страницы по номеру.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    def use_keyset(self, queryset, request):
+        cursor_param = self.keyset_pagination_class.cursor_query_param
+        return (
+            cursor_param in request.query_params
+            and not queryset.query.order_by
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(queryset, request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(RecipePagination):
+    """Курсор по умолчанию, номера страниц — для выборки со своим порядком."""
+
+    def use_keyset(self, queryset, request):
+        return not queryset.query.order_by
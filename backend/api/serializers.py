@@ -1,19 +1,27 @@
-import base64
+from collections import OrderedDict
+from hashlib import md5
+from uuid import uuid4
 
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.core import validators
-from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
-from api.functions import adding_ingredients
+from api.functions import adding_ingredients, updating_ingredients
+from foodgram.metrics import TimedDataMixin, TimedListSerializer
+from recipes.catalog import INGREDIENTS, TAGS, get_catalog_version
+from recipes.images import ImageError, decode_base64_image
+from recipes.jobs import enqueue
 from recipes.models import (
+    RECIPE_THUMBNAIL_FIELDS,
     Ingredient,
     Tag,
     Recipe,
     RecipeIngredient,
-    Follow,
-    FavoriteRecipe,
-    ShoppingCart
+    Follow
 )
 from users.models import User
 
@@ -21,6 +29,12 @@ COOKING_TIME_ANF_AMOUNT_MIN = 1
 COOKING_TIME_ANF_AMOUNT_MAX = 32000
 USERNAME_MAX_LENGTH = 150
 EMAIL_MAX_LENGTH = 254
+RECIPE_LIST_IMAGE_SIZE = 'medium'
+RECIPE_LIST_ACTIONS = ('list', 'feed')
+RECIPE_SHORT_IMAGE_SIZE = 'small'
+RECIPE_CACHE_KEY = 'recipe-repr:{pk}:{version}'
+RECIPE_PERSONAL_FIELDS = ('author', 'is_favorited', 'is_in_shopping_cart')
+BULK_RECIPES_MAX = 100
 
 
 class Base64ImageField(serializers.ImageField):
@@ -29,17 +43,38 @@ class Base64ImageField(serializers.ImageField):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                data = decode_base64_image(imgstr, f'{uuid4().hex}.{ext}')
+            except ImageError as error:
+                raise serializers.ValidationError(str(error))
         return super().to_internal_value(data)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class RecipeImageField(Base64ImageField):
+    """Изображение рецепта нужного размера.
+
+    Если миниатюра ещё не готова, отдаётся исходное изображение.
+    """
+    def __init__(self, size=None, **kwargs):
+        self.size = size
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        if self.size is not None:
+            thumbnail = getattr(instance, RECIPE_THUMBNAIL_FIELDS[self.size])
+            if thumbnail:
+                return thumbnail
+        return super().get_attribute(instance)
+
+
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор работы с пользователями."""
     id = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = (
             'email',
             'id',
@@ -50,6 +85,8 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         try:
             user = self.context['request'].user
         except KeyError:
@@ -112,11 +149,12 @@ class UserCreateSerializer(serializers.ModelSerializer):
         return False
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор ингредиентов."""
 
     class Meta:
         model = Ingredient
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'name',
@@ -124,11 +162,12 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор тегов."""
 
     class Meta:
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'name',
@@ -155,10 +194,25 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор списка/одного рецептов, удаления."""
+class RecipeListSerializer(TimedListSerializer):
+    """Список рецептов с общим кешем представлений."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        return self.child.cached_representations(list(data))
+
+
+class RecipeSerializer(TimedDataMixin, serializers.ModelSerializer):
+    """Сериализатор списка/одного рецептов, удаления.
+
+    Общая для всех пользователей часть рецепта кешируется по ключу из id,
+    времени изменения рецепта и версий справочников, если включён
+    RECIPE_CACHE_ENABLED. Автор и флаги пользователя добавляются к ней
+    при каждом запросе.
+    """
     tags = TagSerializer(many=True)
-    image = Base64ImageField(
+    image = RecipeImageField(
         required=True,
         allow_null=False
     )
@@ -173,6 +227,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = (
             'id',
             'tags',
@@ -186,13 +241,95 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        view = self.context.get('view')
+        if getattr(view, 'action', None) in RECIPE_LIST_ACTIONS:
+            self.fields['image'].size = RECIPE_LIST_IMAGE_SIZE
+
+    def to_representation(self, instance):
+        return self.cached_representations([instance])[0]
+
+    def shared_representation(self, instance):
+        """Часть представления, одинаковая для всех пользователей."""
+        data = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in RECIPE_PERSONAL_FIELDS:
+                continue
+            attribute = field.get_attribute(instance)
+            data[field.field_name] = (
+                None if attribute is None
+                else field.to_representation(attribute)
+            )
+        return data
+
+    def get_cache_key(self, instance, versions):
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        image_size = self.fields['image'].size
+        version = md5(
+            f'{instance.updated.isoformat()}:{base_url}:{image_size}:'
+            f'{versions}'.encode()
+        ).hexdigest()
+        return RECIPE_CACHE_KEY.format(pk=instance.pk, version=version)
+
+    def cached_representations(self, recipes):
+        if settings.RECIPE_CACHE_ENABLED:
+            versions = ':'.join(
+                get_catalog_version(name)['etag']
+                for name in (TAGS, INGREDIENTS)
+            )
+            keys = [
+                self.get_cache_key(recipe, versions) for recipe in recipes
+            ]
+            shared = cache.get_many(keys)
+        else:
+            keys = [recipe.pk for recipe in recipes]
+            shared = {}
+        missing = [
+            (key, recipe) for key, recipe in zip(keys, recipes)
+            if key not in shared
+        ]
+        if missing:
+            prefetch_related_objects(
+                [recipe for _, recipe in missing],
+                'recipe_ingredients__ingredient',
+                'tags'
+            )
+            fresh = {
+                key: self.shared_representation(recipe)
+                for key, recipe in missing
+            }
+            if settings.RECIPE_CACHE_ENABLED:
+                cache.set_many(fresh, settings.RECIPE_CACHE_TIMEOUT)
+            shared.update(fresh)
+        result = []
+        for key, recipe in zip(keys, recipes):
+            if hasattr(recipe, 'author_subscribed'):
+                recipe.author.subscribed = recipe.author_subscribed
+            data = OrderedDict(shared[key])
+            data.update(
+                author=self.fields['author'].to_representation(recipe.author),
+                is_favorited=self.get_is_favorited(recipe),
+                is_in_shopping_cart=self.get_is_in_shopping_cart(recipe)
+            )
+            result.append(OrderedDict(
+                (field_name, data[field_name])
+                for field_name in self.Meta.fields
+            ))
+        return result
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return obj.is_in_shopping_cart(user)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -215,7 +352,7 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор создания/обновления рецептов."""
     image = Base64ImageField(
         required=True,
@@ -238,21 +375,44 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def validate_ingredients(self, value):
+        ids = [ingredient_data['id'] for ingredient_data in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться'
+            )
+        missing = set(ids) - Ingredient.objects.in_bulk(ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}'
+            )
+        return value
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         adding_ingredients(ingredients, recipe)
+        enqueue('process_recipe_image', recipe_id=recipe.pk)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         new_tags = validated_data.pop('tags')
         new_ingredients = validated_data.pop('ingredients')
         instance.tags.set(new_tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        adding_ingredients(new_ingredients, instance)
-        return super().update(instance, validated_data)
+        if updating_ingredients(new_ingredients, instance):
+            enqueue('rebuild_shopping_lists', user_ids=list(
+                User.objects.filter(
+                    cart_recipes__recipe=instance
+                ).values_list('id', flat=True)
+            ))
+        instance = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            enqueue('process_recipe_image', recipe_id=instance.pk)
+        return instance
 
     def to_representation(self, instance):
         serializer = RecipeSerializer(
@@ -279,38 +439,16 @@ class FollowSerializer(serializers.ModelSerializer):
         read_only_fields = ('user',)
 
 
-class CheckFollowSerializer(serializers.ModelSerializer):
-    """Сериализация подписчиков."""
-
-    class Meta:
-        model = Follow
-        fields = ('user', 'following')
-
-    def validate(self, obj):
-        request_method = self.context.get('request').method
-        user, following = obj['user'], obj['following']
-        follow = user.follows.filter(following=following).exists()
-        if request_method == 'POST':
-            if user == following:
-                raise serializers.ValidationError('Подписка на самого себя')
-            if follow:
-                raise serializers.ValidationError('Вы уже подписаны')
-        if request_method == 'DELETE':
-            if user == following:
-                raise serializers.ValidationError('Ошибка')
-            if not follow:
-                raise serializers.ValidationError({'errors': 'Ошибка'})
-        return obj
-
-
-class RecipeShortSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(
+class RecipeShortSerializer(TimedDataMixin, serializers.ModelSerializer):
+    image = RecipeImageField(
+        size=RECIPE_SHORT_IMAGE_SIZE,
         required=True,
         allow_null=False,
     )
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = (
             'id',
             'name',
@@ -319,14 +457,14 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         )
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Сериализатор подписки на автора."""
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = [
             'email',
             'id',
@@ -337,47 +475,35 @@ class AuthorSerializer(serializers.ModelSerializer):
             'recipes_count'
         ]
 
-    def get_recipes_count(self, obj):
-        return obj.recipes_count
-
     def get_recipes(self, obj):
-        recipes = obj.get_user_recipes
+        if hasattr(obj, 'recent_recipes'):
+            recipes = obj.recent_recipes
+        else:
+            recipes = obj.get_user_recipes
         return RecipeShortSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         user = self.context['request'].user
         return obj.following.filter(user=user).exists()
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = FavoriteRecipe
-        fields = (
-            'user',
-            'recipe'
-        )
-
-    def validate(self, attrs):
-        user = self.context['request'].user
-        recipe = attrs['recipe']
-        if user.favorite_recipes.filter(recipe=recipe).exists():
-            raise serializers.ValidationError('Уже в избранном')
-        return attrs
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для массовых операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX
+    )
 
-    class Meta:
-        model = ShoppingCart
-        fields = (
-            'user',
-            'recipe'
+    def validate_recipes(self, value):
+        ids = list(dict.fromkeys(value))
+        missing = set(ids) - set(
+            Recipe.objects.filter(id__in=ids).values_list('id', flat=True)
         )
-
-    def validate(self, attrs):
-        user = self.context['request'].user
-        recipe = attrs['recipe']
-        if user.cart_recipes.filter(recipe=recipe).exists():
-            raise serializers.ValidationError('Уже в корзине')
-        return attrs
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {sorted(missing)}'
+            )
+        return ids
@@ -0,0 +1,138 @@
+import csv
+import datetime
+from io import BytesIO
+from typing import Iterable, Iterator, List
+
+from django.conf import settings
+from django.db.models import QuerySet
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import Recipe, ShoppingListItem
+from users.models import User
+
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+PDF_CHUNK_SIZE = 8192
+
+
+def get_recipes_names(user: User) -> List[str]:
+    return list(
+        Recipe.objects.filter(recipe_cart__user=user)
+        .order_by('name')
+        .values_list('name', flat=True)
+    )
+
+
+def get_ingredients_totals(user: User) -> QuerySet:
+    """Суммарное количество каждого ингредиента в корзине пользователя."""
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount'
+        )
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def _ingredient_rows(ingredients: Iterable[dict]) -> Iterator[tuple]:
+    for ingredient in ingredients:
+        yield (
+            ingredient['ingredient__name'],
+            str(ingredient['total_amount']),
+            ingredient['ingredient__measurement_unit']
+        )
+
+
+def _text_lines(
+        user: User,
+        recipes_names: List[str],
+        ingredients: Iterable[dict]
+) -> Iterator[str]:
+    yield f'Список: {user}: '
+    yield f'Для приготовления: {", ".join(recipes_names)}, возьмите:'
+    for row in _ingredient_rows(ingredients):
+        yield ' '.join(row)
+    yield ''
+    yield 'Foodgram'
+    yield str(datetime.date.today())
+
+
+def shopping_list_txt(
+        user: User,
+        recipes_names: List[str],
+        ingredients: Iterable[dict]
+) -> Iterator[str]:
+    for line in _text_lines(user, recipes_names, ingredients):
+        yield f'{line}\n'
+
+
+class _Echo:
+    """Псевдобуфер: csv.writer сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_csv(
+        user: User,
+        recipes_names: List[str],
+        ingredients: Iterable[dict]
+) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in _ingredient_rows(ingredients):
+        yield writer.writerow(row)
+
+
+def _register_pdf_font():
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_FONT)
+        )
+
+
+def shopping_list_pdf(
+        user: User,
+        recipes_names: List[str],
+        ingredients: Iterable[dict]
+) -> Iterator[bytes]:
+    """PDF-документ списка покупок.
+
+    Формат PDF требует таблицу смещений в конце файла, поэтому документ
+    собирается целиком и затем отдаётся частями.
+    """
+    _register_pdf_font()
+    buffer = BytesIO()
+    width, height = A4
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN
+    for line in _text_lines(user, recipes_names, ingredients):
+        for part in simpleSplit(
+            line, PDF_FONT_NAME, PDF_FONT_SIZE, width - 2 * PDF_MARGIN
+        ) or ['']:
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, part)
+            y -= PDF_LINE_HEIGHT
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_GENERATORS = {
+    'txt': shopping_list_txt,
+    'csv': shopping_list_csv,
+    'pdf': shopping_list_pdf,
+}
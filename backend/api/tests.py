@@ -0,0 +1,427 @@
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.authentication import token_cache
+from api.management.commands.benchmark import (
+    Command as BenchmarkCommand,
+    endpoints,
+    get_user
+)
+from api.management.commands.explain_queries import (
+    SQL_PREVIEW_LENGTH,
+    check_endpoints
+)
+from api.pagination import RecipePagination
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart
+)
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+# seed_data создаёт в среднем 10 рецептов на пользователя: таблица рецептов
+# с запасом больше порога EXPLAIN_MIN_ROWS.
+SEED_USERS = settings.EXPLAIN_MIN_ROWS * 3 // 20
+# Неизбежные проблемы: эндпоинт (None — любой), начало описания
+# проблемы и фрагмент SQL.
+ALLOWED_PROBLEMS = {
+    'postgresql': (
+        # Порядок по релевантности не хранится ни в одном индексе.
+        ('recipes_search', 'Sort', 'ts_rank'),
+        # Теги и рецепты корзины — несколько строк, индекса по имени нет.
+        (None, 'Sort', 'ORDER BY "recipes_tag"."name"'),
+        (None, 'Sort', 'ORDER BY "recipes_recipe"."name"'),
+    ),
+    'sqlite': (
+        # LIKE '%...%' не использует индексы.
+        ('recipes_search', 'SCAN recipes_recipe', ' LIKE '),
+    ),
+}
+
+
+def allowed(name, problem, sql):
+    return any(
+        endpoint in (None, name)
+        and problem.startswith(prefix)
+        and fragment in sql
+        for endpoint, prefix, fragment in ALLOWED_PROBLEMS.get(
+            connection.vendor, ()
+        )
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    RECIPE_CACHE_ENABLED=False
+)
+class QueryPlanTests(TestCase):
+    """Планы запросов основных эндпоинтов используют индексы.
+
+    Проверка идёт в строгом режиме explain_queries: на небольшой базе
+    PostgreSQL с выключенными enable_seqscan и enable_sort оставляет
+    полный просмотр и сортировку, только если подходящего индекса нет.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('import', stdout=io.StringIO())
+        call_command(
+            'seed_data',
+            users=SEED_USERS,
+            follows=10,
+            favorites=20,
+            carts=10,
+            stdout=io.StringIO()
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_seed_exceeds_threshold(self):
+        self.assertGreaterEqual(
+            Recipe.objects.count(),
+            settings.EXPLAIN_MIN_ROWS
+        )
+
+    def test_plans_use_indexes(self):
+        user = get_user(None)
+        results = check_endpoints(
+            user,
+            endpoints(user),
+            settings.EXPLAIN_MIN_ROWS,
+            strict=True
+        )
+        found = [
+            f'{name}: {problem}: {sql[:SQL_PREVIEW_LENGTH]}'
+            for name, _, problems in results
+            for problem, sql in problems
+            if not allowed(name, problem, sql)
+        ]
+        self.assertEqual(found, [])
+
+
+@override_settings(JOBS_ASYNC=False)
+class ShoppingListDownloadTests(TestCase):
+    URLS = (
+        '/api/recipes/download_shopping_cart/',
+        '/api/download_shopping_cart/',
+    )
+    CONTENT_TYPES = {
+        'txt': 'text/plain',
+        'csv': 'text/csv',
+        'pdf': 'application/pdf',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer',
+            email='buyer@example.com',
+            password='password'
+        )
+        recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Борщ',
+            text='Описание',
+            cooking_time=60,
+            image='recipes/images/test.webp'
+        )
+        RecipeIngredient.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='свёкла',
+                measurement_unit='г'
+            ),
+            amount=300
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, url, file_format):
+        response = self.client.get(url, {'format': file_format})
+        self.assertEqual(response.status_code, 200, url)
+        self.assertTrue(
+            response['Content-Type'].startswith(
+                self.CONTENT_TYPES[file_format]
+            ),
+            url
+        )
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename=list.{file_format}'
+        )
+        return b''.join(response.streaming_content)
+
+    def test_download_formats(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertIn(
+                    'свёкла 300 г',
+                    self.download(url, 'txt').decode()
+                )
+                self.assertIn(
+                    'свёкла,300,г',
+                    self.download(url, 'csv').decode()
+                )
+                self.assertTrue(
+                    self.download(url, 'pdf').startswith(b'%PDF')
+                )
+
+    def test_download_requires_authentication(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(APIClient().get(url).status_code, 401)
+
+
+class RecipeRelationBulkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='password'
+        )
+        cls.recipe_ids = [
+            Recipe.objects.create(
+                author=cls.user,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/test.webp'
+            ).pk
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def favorites_count(self):
+        return list(
+            Recipe.objects.filter(pk__in=self.recipe_ids)
+            .order_by('pk')
+            .values_list('favorites_count', flat=True)
+        )
+
+    def test_bulk_add_and_remove(self):
+        url = '/api/recipes/favorite/'
+        response = self.client.post(
+            url, {'recipes': self.recipe_ids[:2]}, format='json'
+        )
+        self.assertEqual(
+            [item['changed'] for item in response.json()],
+            [True, True]
+        )
+        self.assertEqual(self.favorites_count(), [1, 1, 0])
+        table = FavoriteRecipe._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(
+                url, {'recipes': self.recipe_ids[1:]}, format='json'
+            )
+        self.assertEqual(
+            [item['changed'] for item in response.json()],
+            [True, False]
+        )
+        self.assertEqual(self.favorites_count(), [1, 0, 0])
+        reads = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and table in query['sql']
+        ]
+        self.assertEqual(len(reads), 1, reads)
+
+
+class RecipePaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        now = timezone.now()
+        for number in range(api_settings.PAGE_SIZE * 2 + 1):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'суп {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/test.webp'
+            )
+            # Совпадающие даты проверяют второй ключ курсора, id.
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timezone.timedelta(hours=number // 2)
+            )
+
+    def walk(self, params):
+        """id рецептов со всех страниц, по ссылкам next."""
+        ids = []
+        url = '/api/recipes/'
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url, params = data['next'], None
+        return ids
+
+    def test_cursor_pages_match_page_numbers(self):
+        for params in ({}, {'search': 'суп'}):
+            with self.subTest(params=params):
+                by_page = self.walk(params)
+                by_cursor = self.walk({**params, 'cursor': ''})
+                self.assertEqual(len(by_page), Recipe.objects.count())
+                self.assertEqual(by_cursor, by_page)
+
+    def test_own_order_falls_back_to_page_numbers(self):
+        request = Request(APIRequestFactory().get('/api/recipes/?cursor='))
+        paginator = RecipePagination()
+        queryset = Recipe.objects.order_by('name')
+        page = paginator.paginate_queryset(queryset, request)
+        self.assertIsNone(paginator.keyset)
+        self.assertEqual(
+            [recipe.pk for recipe in page],
+            list(
+                queryset.values_list('pk', flat=True)
+                [:api_settings.PAGE_SIZE]
+            )
+        )
+        self.assertEqual(
+            paginator.get_paginated_response([]).data['count'],
+            Recipe.objects.count()
+        )
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    URL = '/api/users/me/'
+    LOCAL_CACHE = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='token_user',
+            email='token_user@example.com',
+            password='password'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def token_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if Token._meta.db_table in query['sql']
+        ]
+
+    def check_cached(self):
+        self.assertTrue(self.token_queries())
+        self.assertEqual(self.token_queries(), [])
+
+    def test_local_cache_uses_lru(self):
+        with override_settings(CACHES=self.LOCAL_CACHE):
+            self.check_cached()
+
+    def test_dummy_cache_uses_lru(self):
+        with override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            },
+        }):
+            self.check_cached()
+
+    def test_shared_cache_checks_version(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with override_settings(CACHES={
+            'default': {
+                'BACKEND': (
+                    'django.core.cache.backends.filebased.FileBasedCache'
+                ),
+                'LOCATION': location,
+            },
+        }):
+            self.check_cached()
+
+    def test_logout_revokes_cached_token(self):
+        with override_settings(CACHES=self.LOCAL_CACHE):
+            self.check_cached()
+            self.token.delete()
+            self.assertEqual(self.client.get(self.URL).status_code, 401)
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+
+    def compare(self, previous, current):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = Path(directory) / 'baseline.json'
+        path.write_text(json.dumps({'results': previous}))
+        output = io.StringIO()
+        command = BenchmarkCommand(stdout=output)
+        command.compare({'results': current}, path, 0.2)
+        return output.getvalue()
+
+    def test_zero_baseline(self):
+        previous = {'tags': {'p95_ms': 0, 'queries': 0}}
+        output = self.compare(
+            previous, {'tags': {'p95_ms': 0.5, 'queries': 0}}
+        )
+        self.assertIn('+0.50 мс', output)
+        with self.assertRaises(CommandError):
+            self.compare(previous, {'tags': {'p95_ms': 5, 'queries': 0}})
+
+    def test_relative_change(self):
+        previous = {'recipes': {'p95_ms': 10, 'queries': 4}}
+        self.assertIn(
+            '+10%',
+            self.compare(previous, {'recipes': {'p95_ms': 11, 'queries': 4}})
+        )
+        with self.assertRaises(CommandError):
+            self.compare(previous, {'recipes': {'p95_ms': 13, 'queries': 4}})
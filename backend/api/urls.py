@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from foodgram.async_views import read_urlpatterns, read_view
 from .views import (
     RecipeViewSet,
     IngredientViewSet,
@@ -19,15 +20,27 @@ router.register(r'tags', TagViewSet, basename='tags')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
+    # Параметры @action (рендереры, выбор формата, права) роутер
+    # передаёт в as_view() сам, для отдельного маршрута — явно.
     path('download_shopping_cart/',
-         RecipeViewSet.as_view({'get': 'download_shopping_cart'}),
+         read_view(RecipeViewSet.as_view(
+             {'get': 'download_shopping_cart'},
+             **RecipeViewSet.download_shopping_cart.kwargs)),
          name='download_shopping_cart'),
     path('users/subscriptions/',
-         FollowViewSet.as_view({'get': 'follows_list'}),
+         read_view(FollowViewSet.as_view({'get': 'follows_list'})),
          name='follows_list'),
     path('users/<int:id>/subscribe/',
          FollowViewSet.as_view({'post': 'create', 'delete': 'destroy'}),
          name='follow'),
+    path('recipes/favorite/',
+         FavoriteViewSet.as_view(
+             {'post': 'bulk_add', 'delete': 'bulk_remove'}),
+         name='favorite_bulk'),
+    path('recipes/shopping_cart/',
+         ShoppingCartViewSet.as_view(
+             {'post': 'bulk_add', 'delete': 'bulk_remove'}),
+         name='shopping_cart_bulk'),
     path('recipes/<int:id>/favorite/',
          FavoriteViewSet.as_view({'post': 'create', 'delete': 'destroy'}),
          name='favorite'),
@@ -37,10 +50,10 @@ urlpatterns = [
     path('auth/',
          include('djoser.urls.authtoken')),
     path('users/<int:pk>/',
-         UserRetrieveViewSet.as_view(
-             {'get': 'retrieve'})),
+         read_view(UserRetrieveViewSet.as_view(
+             {'get': 'retrieve'}))),
     path('',
          include('djoser.urls')),
     path('',
-         include(router.urls)),
+         include(read_urlpatterns(router.urls))),
 ]
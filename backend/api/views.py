@@ -1,45 +1,62 @@
-import datetime
 from http import HTTPStatus
 
-from django.db import transaction
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, serializers
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
 from rest_framework.mixins import RetrieveModelMixin
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet
 
 from api.filters import RecipeFilter
+from api.functions import (
+    adding_recipes,
+    authors_with_recipes,
+    get_recipes_limit,
+    removing_recipes
+)
+from api.pagination import FeedPagination, RecipePagination
+from api.renderers import (
+    CSVShoppingListRenderer,
+    FormatParamNegotiation,
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer
+)
+from api.shopping_list import (
+    SHOPPING_LIST_GENERATORS,
+    get_ingredients_totals,
+    get_recipes_names
+)
+from recipes.catalog import INGREDIENTS, TAGS, get_catalog_version
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (
     Ingredient,
     Tag,
     Recipe,
     Follow,
     FavoriteRecipe,
-    ShoppingCart,
-    RecipeIngredient
+    ShoppingCart
 )
 from users.models import User
-from .permissions import (
-    IsAdminOrSuperuserOrReadOnly,
-    IsAuthorStaffOrReadOnly
-)
+from .permissions import IsAdminOrSuperuserOrReadOnly
 from .serializers import (
     IngredientSerializer,
     TagSerializer,
     RecipeSerializer,
     RecipeCreateSerializer,
-    CheckFollowSerializer,
     AuthorSerializer,
     RecipeShortSerializer,
-    FavoriteSerializer,
-    ShoppingCartSerializer
+    BulkRecipesSerializer
 )
 
 
@@ -48,16 +65,58 @@ class UserRetrieveViewSet(RetrieveModelMixin, GenericViewSet):
     serializer_class = AuthorSerializer
     permission_classes = (IsAuthenticated,)
 
+    def get_queryset(self):
+        return authors_with_recipes(
+            User.objects.all(),
+            self.request.user,
+            get_recipes_limit(self.request)
+        )
+
+
+def catalog_http_cache(name):
+    """Условные ответы и Cache-Control по версии справочника.
+
+    Проверка If-None-Match выполняется до аутентификации DRF,
+    поэтому ответ 304 не обращается к базе данных.
+    """
+    def etag(request, *args, **kwargs):
+        return get_catalog_version(name)['etag']
+
+    def last_modified(request, *args, **kwargs):
+        return get_catalog_version(name)['modified']
 
+    def decorator(view_class):
+        view_class = method_decorator(
+            condition(etag_func=etag, last_modified_func=last_modified),
+            name='dispatch'
+        )(view_class)
+        return method_decorator(
+            cache_control(
+                public=True,
+                max_age=settings.CATALOG_CACHE_MAX_AGE
+            ),
+            name='dispatch'
+        )(view_class)
+    return decorator
+
+
+@catalog_http_cache(INGREDIENTS)
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrSuperuserOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = [SearchFilter]
-    search_fields = ['name']
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(api_settings.SEARCH_PARAM)
+        if not name:
+            return Response(ingredient_index.all())
+        limit = request.query_params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        return Response(ingredient_index.search(name, limit))
 
 
+@catalog_http_cache(TAGS)
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrSuperuserOrReadOnly,)
     queryset = Tag.objects.all()
@@ -68,6 +127,7 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = [
@@ -78,10 +138,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ]
 
     def get_queryset(self):
-        queryset = Recipe.objects.prefetch_related(
-            'recipe_ingredients__ingredient',
-            'tags'
-        ).all()
+        queryset = Recipe.objects.select_related(
+            'author'
+        ).with_user_flags(self.request.user)
         return queryset
 
     def get_serializer_class(self):
@@ -92,94 +151,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         url_path='download_shopping_cart',
         detail=False,
-        permission_classes=(IsAuthorStaffOrReadOnly,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            PDFShoppingListRenderer
+        ),
+        content_negotiation_class=FormatParamNegotiation
     )
     def download_shopping_cart(self, request):
         user = request.user
-        cart_recipes = user.cart_recipes.all()
-        recipes_names = ', '.join(
-            [cart_recipe.recipe.name for cart_recipe in cart_recipes])
-        ingredients_dict = (
-            RecipeIngredient.objects.filter(recipe__recipe_cart__user=user)
-            .values('ingredient__name', 'ingredient__measurement_unit').
-            annotate(total_amount=Sum('amount')))
-        ingredients_list = [
-            (ingredient['ingredient__name'], str(ingredient['total_amount']),
-             ingredient['ingredient__measurement_unit']) for
-            ingredient in ingredients_dict]
-        shoping_list = (f'Список: {user}: \n'
-                        f'Для приготовления: {recipes_names}, '
-                        f'возьмите:\n')
-        for ingredient in ingredients_list:
-            shoping_list += f'{" ".join(ingredient)}\n'
-        shoping_list += (f'\nFoodgram\n'
-                         f'{datetime.date.today()}')
-        filename = 'list.txt'
-        response = HttpResponse(
-            shoping_list,
-            content_type='text/plain'
+        file_format = request.accepted_renderer.format
+        content = SHOPPING_LIST_GENERATORS[file_format](
+            user,
+            get_recipes_names(user),
+            get_ingredients_totals(user).iterator()
         )
+        response = StreamingHttpResponse(
+            content,
+            content_type=request.accepted_renderer.media_type
+        )
+        filename = f'list.{file_format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Subquery(
+                Follow.objects.filter(user=request.user).values('following')
+            )
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic()
+    def perform_destroy(self, instance):
+        instance.delete()
+
 
 class FollowViewSet(viewsets.ViewSet):
-    permission_classes = (IsAuthorStaffOrReadOnly,)
+    permission_classes = (IsAuthenticated,)
 
-    @action(
-        methods=['POST'],
-        detail=True,
-        permission_classes=(IsAuthenticated,)
-    )
     @transaction.atomic()
     def create(self, request, id=None):
         user = request.user
-        following = get_object_or_404(User, pk=id)
-        data = {
-            'user': user.id,
-            'following': following.id,
-        }
-        serializer = CheckFollowSerializer(
-            data=data,
-            context={'request': request},
+        if user.pk == id:
+            raise serializers.ValidationError('Подписка на самого себя')
+        following = get_object_or_404(
+            authors_with_recipes(
+                User.objects.all(),
+                user,
+                get_recipes_limit(request)
+            ),
+            pk=id
         )
-        serializer.is_valid(raise_exception=True)
-        Follow.objects.create(user=user, following=following)
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=user, following=following)
+        except IntegrityError:
+            raise serializers.ValidationError('Вы уже подписаны')
+        following.subscribed = True
         serializer = AuthorSerializer(following, context={'request': request})
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
-    @action(
-        detail=True,
-        methods=['DELETE'],
-        permission_classes=(IsAuthorStaffOrReadOnly,)
-    )
     @transaction.atomic()
     def destroy(self, request, id=None):
-        user = request.user
-        following = get_object_or_404(User, pk=id)
-        data = {
-            'user': user.id,
-            'following': following.id,
-        }
-        serializer = CheckFollowSerializer(
-            data=data,
-            context={'request': request},
-        )
-        serializer.is_valid(raise_exception=True)
-        follow = user.follows.filter(following=following)
-        follow.delete()
+        deleted, _ = request.user.follows.filter(following_id=id).delete()
+        if not deleted:
+            get_object_or_404(User, pk=id)
+            raise serializers.ValidationError({'errors': 'Ошибка'})
         return Response(status=HTTPStatus.NO_CONTENT)
 
-    @action(
-        detail=False,
-        permission_classes=(IsAuthorStaffOrReadOnly,)
-    )
     def follows_list(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = authors_with_recipes(
+            User.objects.filter(following__user=user),
+            user,
+            get_recipes_limit(request)
+        ).order_by('id')
         paginator = PageNumberPagination()
         paginated_queryset = paginator.paginate_queryset(queryset, request)
         serializer = AuthorSerializer(
@@ -190,27 +248,29 @@ class FollowViewSet(viewsets.ViewSet):
         return paginator.get_paginated_response(serializer.data)
 
 
-class FavoriteViewSet(viewsets.ViewSet):
+class RecipeRelationViewSet(viewsets.ViewSet):
+    """Избранное или корзина: один рецепт или список за один запрос.
+
+    Уникальность пары (пользователь, рецепт) проверяет база данных,
+    поэтому каждое переключение — одна вставка или одно удаление.
+    Маршруты заданы в urls.py через as_view, поэтому права доступа
+    указаны на уровне класса, а не в декораторах action.
+    """
+    permission_classes = (IsAuthenticated,)
+    relation_model = None
+    state_field = None
+    exists_message = None
+    missing_message = None
 
-    @action(
-        methods=['POST'],
-        detail=True,
-        permission_classes=(IsAuthenticated,)
-    )
     @transaction.atomic()
     def create(self, request, id=None):
         user = request.user
         recipe = get_object_or_404(Recipe, id=id)
-        data = {
-            'user': user.id,
-            'recipe': recipe.id,
-        }
-        serializer = FavoriteSerializer(
-            data=data,
-            context={'request': request},
-        )
-        serializer.is_valid(raise_exception=True)
-        FavoriteRecipe.objects.create(user=user, recipe=recipe)
+        try:
+            with transaction.atomic():
+                self.relation_model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
+            raise serializers.ValidationError(self.exists_message)
         serializer = RecipeShortSerializer(
             recipe,
             context={'request': request}
@@ -222,73 +282,61 @@ class FavoriteViewSet(viewsets.ViewSet):
         )
 
     @transaction.atomic()
-    @action(
-        methods=['POST'],
-        detail=True,
-        permission_classes=(IsAuthorStaffOrReadOnly,)
-    )
-    def destroy(self, request, id=None, ):
+    def destroy(self, request, id=None):
         user = request.user
-        try:
-            recipe = Recipe.objects.filter(pk=id).first()
-        except Recipe.DoesNotExist:
-            raise serializers.ValidationError('Рецепта нет')
-        if not user.favorite_recipes.filter(recipe=recipe).first():
-            raise serializers.ValidationError('Рецепт не в избранном')
-        user.favorite_recipes.filter(recipe=recipe).delete()
+        deleted, _ = self.relation_model.objects.filter(
+            user=user,
+            recipe_id=id
+        ).delete()
+        if not deleted:
+            raise serializers.ValidationError(self.missing_message)
         return Response(
             status=HTTPStatus.NO_CONTENT,
             exception=True
         )
 
+    def bulk_response(self, recipe_ids, changed, state):
+        changed = set(changed)
+        return Response([
+            {
+                'id': recipe_id,
+                self.state_field: state,
+                'changed': recipe_id in changed
+            }
+            for recipe_id in recipe_ids
+        ])
 
-class ShoppingCartViewSet(viewsets.ViewSet):
+    def get_recipe_ids(self, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
 
-    @action(
-        methods=['POST'],
-        detail=True,
-        permission_classes=(IsAuthenticated,)
-    )
     @transaction.atomic()
-    def create(self, request, id=None):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        data = {
-            'user': user.id,
-            'recipe': recipe.id,
-        }
-        serializer = ShoppingCartSerializer(
-            data=data,
-            context={'request': request},
-        )
-        serializer.is_valid(raise_exception=True)
-        ShoppingCart.objects.create(user=user, recipe=recipe)
-        serializer = RecipeShortSerializer(
-            recipe,
-            context={'request': request}
-        )
-        return Response(
-            serializer.data,
-            status=HTTPStatus.CREATED,
-            exception=True
-        )
+    def bulk_add(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        added = adding_recipes(self.relation_model, request.user, recipe_ids)
+        return self.bulk_response(recipe_ids, added, True)
 
     @transaction.atomic()
-    @action(
-        methods=['POST'],
-        detail=True,
-        permission_classes=(IsAuthorStaffOrReadOnly,)
-    )
-    def destroy(self, request, id=None):
-        user = request.user
-        try:
-            recipe = Recipe.objects.filter(pk=id).first()
-        except Recipe.DoesNotExist:
-            raise serializers.ValidationError('Рецепта нет')
-        if not user.cart_recipes.filter(recipe=recipe).first():
-            raise serializers.ValidationError('Рецепт не в корзине')
-        user.cart_recipes.filter(recipe=recipe).delete()
-        return Response(
-            status=HTTPStatus.NO_CONTENT,
-            exception=True
+    def bulk_remove(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        removed = removing_recipes(
+            self.relation_model,
+            request.user,
+            recipe_ids
         )
+        return self.bulk_response(recipe_ids, removed, False)
+
+
+class FavoriteViewSet(RecipeRelationViewSet):
+    relation_model = FavoriteRecipe
+    state_field = 'is_favorited'
+    exists_message = 'Уже в избранном'
+    missing_message = 'Рецепт не в избранном'
+
+
+class ShoppingCartViewSet(RecipeRelationViewSet):
+    relation_model = ShoppingCart
+    state_field = 'is_in_shopping_cart'
+    exists_message = 'Уже в корзине'
+    missing_message = 'Рецепт не в корзине'
@@ -1,7 +1,10 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from foodgram.async_views import StreamingASGIHandler  # noqa: E402
+
+application = StreamingASGIHandler()
@@ -0,0 +1,152 @@
+"""Асинхронный режим представлений чтения для запуска через ASGI.
+
+Под ASGI Django выполняет синхронные представления в одном общем
+потоке, и медленный запрос задерживает все остальные запросы
+воркера. Обёрнутые представления выполняют безопасные запросы
+в отдельном пуле потоков, каждый со своим соединением с базой,
+а изменяющие запросы — в общем потоке, как обычно.
+
+Django 3.2 перебирает тело потокового ответа прямо в цикле событий,
+поэтому приложение ASGI использует StreamingASGIHandler: он читает
+тело по кускам в отдельном потоке ответа.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db import check_connections, mark_connections_used
+from foodgram.metrics import current_metrics
+
+read_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS,
+    thread_name_prefix='read-view'
+)
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление в текущем потоке и отрисовывает ответ.
+
+    Тело потокового ответа здесь не читается: его по кускам читает
+    StreamingASGIHandler.
+    """
+    close_old_connections()
+    check_connections()
+    metrics = current_metrics.get()
+    try:
+        with metrics.collect_queries() if metrics else nullcontext():
+            response = view(request, *args, **kwargs)
+            if not response.streaming and callable(
+                    getattr(response, 'render', None)
+            ):
+                response = response.render()
+        return response
+    finally:
+        mark_connections_used()
+        close_old_connections()
+
+
+def async_view(view):
+    read = sync_to_async(
+        run_view,
+        thread_sensitive=False,
+        executor=read_executor
+    )
+    write = sync_to_async(run_view, thread_sensitive=True)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        run = read if request.method in SAFE_METHODS else write
+        return await run(view, request, *args, **kwargs)
+    return wrapper
+
+
+def read_view(view):
+    """Асинхронное представление, если включён ASYNC_READ_VIEWS."""
+    if settings.ASYNC_READ_VIEWS:
+        return async_view(view)
+    return view
+
+
+def read_urlpatterns(patterns):
+    for pattern in patterns:
+        pattern.callback = read_view(pattern.callback)
+    return patterns
+
+
+def response_headers(response):
+    """Заголовки и cookie ответа в формате ASGI."""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((
+            b'Set-Cookie',
+            cookie.output(header='').encode('ascii').strip()
+        ))
+    return headers
+
+
+def close_stream(response):
+    """Закрывает ответ и соединения потока, читавшего его тело."""
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """Обработчик ASGI, читающий тело потокового ответа вне цикла событий.
+
+    Каждый кусок тела читается в отдельном потоке ответа, в котором
+    генератор тела и выполняется, и закрывается. Цикл событий только
+    отправляет готовые куски, поэтому тело не собирается в памяти,
+    а медленная генерация не задерживает другие соединения.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        parts = iter(response)
+        end = object()
+        executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix='stream'
+        )
+        try:
+            while True:
+                part = await loop.run_in_executor(
+                    executor, context.run, next, parts, end
+                )
+                if part is end:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(
+                executor, context.run, close_stream, response
+            )
+            executor.shutdown(wait=False)
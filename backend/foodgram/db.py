@@ -0,0 +1,63 @@
+"""Маршрутизация чтения на реплику и проверка постоянных соединений."""
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+read_database = ContextVar('read_database', default=DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    """Чтение из базы, выбранной для текущего запроса, запись в основную.
+
+    Базу для чтения выбирает ReplicaRoutingMiddleware; вне запросов,
+    например в командах и воркере заданий, всё идёт в основную базу.
+    Внутри транзакции чтение тоже идёт в основную базу, чтобы видеть
+    свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_database.get()
+        if (
+            alias != DEFAULT_DB_ALIAS
+            and connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def check_connections(**kwargs):
+    """Закрывает постоянные соединения, которые не отвечают после простоя.
+
+    Следующий запрос к базе откроет новое соединение, а не получит
+    ошибку от соединения, разорванного сервером или балансировщиком.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        idle = now - getattr(connection, 'last_used', now)
+        if (
+            idle > settings.DB_HEALTH_CHECK_IDLE
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+def mark_connections_used(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.last_used = now
@@ -0,0 +1,238 @@
+"""Метрики запросов для Prometheus и заголовка Server-Timing."""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Полное время обработки запроса.',
+    ['route', 'method']
+)
+VIEW_DURATION = Histogram(
+    'foodgram_view_duration_seconds',
+    'Время работы представления.',
+    ['route']
+)
+SERIALIZER_DURATION = Histogram(
+    'foodgram_serializer_duration_seconds',
+    'Время сериализации ответа.',
+    ['route']
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Суммарное время SQL-запросов за запрос.',
+    ['route']
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries',
+    'Число SQL-запросов за запрос.',
+    ['route'],
+    buckets=QUERY_COUNT_BUCKETS
+)
+DB_DUPLICATE_QUERIES = Histogram(
+    'foodgram_db_duplicate_queries',
+    'Число повторов одинаковых SQL-запросов за запрос.',
+    ['route'],
+    buckets=QUERY_COUNT_BUCKETS
+)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+def fingerprint(sql):
+    """Текст запроса без длины списков IN (...)."""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view_time = None
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self.depth = Counter()
+        self.collecting_threads = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[fingerprint(sql)] += 1
+
+    @contextmanager
+    def collect_queries(self):
+        """Учитывает запросы соединений текущего потока, без повторов."""
+        thread = threading.get_ident()
+        if thread in self.collecting_threads:
+            yield
+            return
+        self.collecting_threads.add(thread)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self))
+                yield
+        finally:
+            self.collecting_threads.discard(thread)
+
+    @contextmanager
+    def timer(self, name):
+        """Измеряет только внешний из вложенных вызовов."""
+        self.depth[name] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[name] -= 1
+            if not self.depth[name]:
+                self.timings[name] += time.perf_counter() - start
+
+    def view_started(self):
+        self.view_start = time.perf_counter()
+
+    def view_finished(self):
+        if self.view_start is not None:
+            self.view_time = time.perf_counter() - self.view_start
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.queries.items() if count > 1}
+
+    @property
+    def duplicate_count(self):
+        """Сколько запросов повторили уже выполненный."""
+        return sum(count - 1 for count in self.duplicates.values())
+
+    def server_timing(self):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.query_count} queries"',
+            f'dup;desc="{self.duplicate_count} duplicate queries"',
+        ]
+        if 'serializer' in self.timings:
+            metrics.append(
+                f'serializer;dur={self.timings["serializer"] * 1000:.1f}'
+            )
+        if self.view_time is not None:
+            metrics.append(f'view;dur={self.view_time * 1000:.1f}')
+        total = time.perf_counter() - self.start
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def observe(self, route, method):
+        REQUEST_DURATION.labels(route, method).observe(
+            time.perf_counter() - self.start
+        )
+        if self.view_time is not None:
+            VIEW_DURATION.labels(route).observe(self.view_time)
+        if 'serializer' in self.timings:
+            SERIALIZER_DURATION.labels(route).observe(
+                self.timings['serializer']
+            )
+        DB_DURATION.labels(route).observe(self.db_time)
+        DB_QUERIES.labels(route).observe(self.query_count)
+        DB_DUPLICATE_QUERIES.labels(route).observe(self.duplicate_count)
+        repeated = {
+            sql: count for sql, count in self.duplicates.items()
+            if count >= settings.METRICS_DUPLICATE_QUERY_THRESHOLD
+        }
+        if repeated:
+            logger.warning(
+                'Повторяющиеся запросы в %s %s: %s',
+                method,
+                route,
+                '; '.join(
+                    f'{count} x {sql}' for sql, count in repeated.items()
+                )
+            )
+
+
+class TimedDataMixin:
+    """Время .data сериализатора в метриках текущего запроса.
+
+    Подмешивается к сериализаторам проекта; у списков в Meta
+    указывается list_serializer_class = TimedListSerializer.
+    """
+
+    @property
+    def data(self):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().data
+        with metrics.timer('serializer'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+def metrics_allowed(request):
+    """Доступ к /metrics по токену или с адресов из METRICS_ALLOWED_IPS."""
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if constant_time_compare(
+                authorization,
+                f'Bearer {settings.METRICS_TOKEN}'
+        ):
+            return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus.
+
+    Если задана PROMETHEUS_MULTIPROC_DIR, значения собираются
+    со всех процессов gunicorn.
+    """
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry),
+        content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,183 @@
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async
+)
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db import REPLICA_DB_ALIAS, read_database
+from foodgram.metrics import RequestMetrics, current_metrics, route_name
+
+READ_PRIMARY_HEADER = 'X-Read-Primary'
+
+
+def view_started():
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.view_started()
+
+
+class RequestMetricsMiddleware:
+    """Число и время SQL-запросов, время представления и сериализации.
+
+    Значения попадают в гистограммы Prometheus с меткой маршрута,
+    а при METRICS_SERVER_TIMING — в заголовок Server-Timing ответов
+    персоналу и в режиме отладки. У потоковых ответов запросы,
+    выполненные при выдаче тела, учитываются только в гистограммах.
+    Под ASGI запросы к базе учитывают представления из
+    foodgram.async_views, выполняемые в своих потоках.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with metrics.collect_queries():
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(
+            request,
+            response,
+            metrics,
+            self.server_timing_allowed(request)
+        )
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        # Пользователь сессии загружается из базы, поэтому не в цикле событий.
+        return self.finish(
+            request,
+            response,
+            metrics,
+            await sync_to_async(self.server_timing_allowed)(request)
+        )
+
+    def server_timing_allowed(self, request):
+        """Server-Timing раскрывает время SQL-запросов, поэтому его
+        получают только персонал и режим отладки."""
+        if not settings.METRICS_SERVER_TIMING:
+            return False
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def finish(self, request, response, metrics, server_timing):
+        metrics.view_finished()
+        if server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        route = route_name(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, metrics, route, request.method
+            )
+        else:
+            metrics.observe(route, request.method)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_started()
+
+    async def aprocess_view(self, request, view_func, view_args,
+                            view_kwargs):
+        view_started()
+
+    def stream(self, content, metrics, route, method):
+        try:
+            with metrics.collect_queries():
+                yield from content
+        finally:
+            metrics.observe(route, method)
+
+
+class ReplicaRoutingMiddleware:
+    """Безопасные запросы читают из реплики, остальные — из основной базы.
+
+    После успешного изменяющего запроса клиент получает cookie
+    и следующие REPLICA_PIN_SECONDS секунд читает из основной базы,
+    поэтому сразу видит свои изменения. Заголовок X-Read-Primary
+    тоже направляет чтение в основную базу.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        database = self.database_for(request)
+        token = read_database.set(database)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, database
+            )
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        database = self.database_for(request)
+        token = read_database.set(database)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, database
+            )
+        return self.finish(request, response)
+
+    def database_for(self, request):
+        if (
+            request.method in SAFE_METHODS
+            and settings.REPLICA_PIN_COOKIE not in request.COOKIES
+            and READ_PRIMARY_HEADER not in request.headers
+        ):
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def finish(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def stream(self, content, database):
+        """Тело потокового ответа читается из той же базы, что и запрос."""
+        token = read_database.set(database)
+        try:
+            yield from content
+        finally:
+            read_database.reset(token)
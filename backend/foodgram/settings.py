@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'rest_framework.authtoken',
@@ -42,6 +43,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_SERVER_TIMING = (
+    os.getenv('METRICS_SERVER_TIMING', 'False').lower() == 'true'
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+METRICS_DUPLICATE_QUERY_THRESHOLD = int(
+    os.getenv('METRICS_DUPLICATE_QUERY_THRESHOLD', 3)
+)
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'foodgram.middleware.RequestMetricsMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -69,7 +84,44 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
+    }
+}
+DB_HEALTH_CHECK_IDLE = int(os.getenv('DB_HEALTH_CHECK_IDLE', 30))
+
+REPLICA_PIN_COOKIE = 'read_primary'
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+if 'replica' in DATABASES:
+    DATABASE_ROUTERS = ['foodgram.db.ReplicaRouter']
+    MIDDLEWARE.append('foodgram.middleware.ReplicaRoutingMiddleware')
+
+MEMCACHED_BACKEND = 'django.core.cache.backends.memcached.PyMemcacheCache'
+FILE_CACHE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', MEMCACHED_BACKEND)
+CACHE_OPTIONS = {
+    MEMCACHED_BACKEND: {
+        'ignore_exc': True,
+        'connect_timeout': 1,
+        'timeout': 1,
+    },
+    FILE_CACHE_BACKEND: {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        'CULL_FREQUENCY': 10,
+    },
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+        'OPTIONS': CACHE_OPTIONS.get(CACHE_BACKEND, {}),
     }
 }
 
@@ -102,6 +154,56 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 300))
+CATALOG_VERSION_CACHE_TIMEOUT = int(
+    os.getenv('CATALOG_VERSION_CACHE_TIMEOUT', 60)
+)
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 6000))
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', 'WEBP')
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_SIZE = (1280, 1280)
+RECIPE_THUMBNAIL_SIZES = {
+    'small': (240, 240),
+    'medium': (640, 640),
+}
+
+JOBS_ASYNC = os.getenv('JOBS_ASYNC', 'False').lower() == 'true'
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', 10 * 60))
+JOBS_RETENTION = int(os.getenv('JOBS_RETENTION', 7 * 24 * 60 * 60))
+
+RECIPE_CACHE_ENABLED = (
+    os.getenv('RECIPE_CACHE_ENABLED', 'True').lower() == 'true'
+    and CACHE_BACKEND != FILE_CACHE_BACKEND
+)
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 20))
+
+# Таблицы меньше этого числа строк explain_queries не проверяет на полный
+# просмотр: на них планировщик законно выбирает Seq Scan.
+EXPLAIN_MIN_ROWS = int(os.getenv('EXPLAIN_MIN_ROWS', 1000))
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 30))
+AUTH_TOKEN_SHARED_CACHE = os.getenv('AUTH_TOKEN_SHARED_CACHE', 'default')
+AUTH_TOKEN_SHARED_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_SHARED_CACHE_TIMEOUT', 5 * 60)
+)
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() == 'true'
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', 16))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -110,7 +212,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
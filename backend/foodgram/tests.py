@@ -0,0 +1,125 @@
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings
+)
+
+from foodgram.db import REPLICA_DB_ALIAS, read_database
+from foodgram.middleware import READ_PRIMARY_HEADER, ReplicaRoutingMiddleware
+from recipes.models import Recipe
+
+REPLICA_ROUTERS = ['foodgram.db.ReplicaRouter']
+
+
+@override_settings(DATABASE_ROUTERS=REPLICA_ROUTERS)
+class ReplicaRouterTests(TransactionTestCase):
+
+    def read_from(self, alias):
+        token = read_database.set(alias)
+        try:
+            return router.db_for_read(Recipe), router.db_for_write(Recipe)
+        finally:
+            read_database.reset(token)
+
+    def test_outside_request_uses_primary(self):
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(
+            self.read_from(REPLICA_DB_ALIAS),
+            (REPLICA_DB_ALIAS, DEFAULT_DB_ALIAS)
+        )
+
+    def test_pinned_reads_go_to_primary(self):
+        self.assertEqual(
+            self.read_from(DEFAULT_DB_ALIAS),
+            (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS)
+        )
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(
+                self.read_from(REPLICA_DB_ALIAS),
+                (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS)
+            )
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'recipes'))
+        self.assertFalse(router.allow_migrate(REPLICA_DB_ALIAS, 'recipes'))
+
+
+@override_settings(DATABASE_ROUTERS=REPLICA_ROUTERS)
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.databases_used = []
+
+    def get_response(self, status=200):
+        def view(request):
+            self.databases_used.append(router.db_for_read(Recipe))
+            return HttpResponse(status=status)
+        return view
+
+    def call(self, request, status=200):
+        middleware = ReplicaRoutingMiddleware(self.get_response(status))
+        response = middleware(request)
+        return self.databases_used[-1], response
+
+    def test_safe_request_reads_from_replica(self):
+        database, response = self.call(self.factory.get('/api/recipes/'))
+        self.assertEqual(database, REPLICA_DB_ALIAS)
+        self.assertNotIn('read_primary', response.cookies)
+
+    def test_write_reads_from_primary_and_pins(self):
+        database, response = self.call(self.factory.post('/api/recipes/'))
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+        self.assertEqual(response.cookies['read_primary'].value, '1')
+
+    def test_failed_write_does_not_pin(self):
+        _, response = self.call(self.factory.post('/api/recipes/'), 400)
+        self.assertNotIn('read_primary', response.cookies)
+
+    def test_pin_cookie_reads_from_primary(self):
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES['read_primary'] = '1'
+        database, _ = self.call(request)
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+
+    def test_header_reads_from_primary(self):
+        request = self.factory.get(
+            '/api/recipes/',
+            **{f'HTTP_{READ_PRIMARY_HEADER.upper().replace("-", "_")}': '1'}
+        )
+        database, _ = self.call(request)
+        self.assertEqual(database, DEFAULT_DB_ALIAS)
+
+    def test_streaming_body_reads_from_request_database(self):
+        def content():
+            yield router.db_for_read(Recipe)
+
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: StreamingHttpResponse(content())
+        )
+        response = middleware(self.factory.get('/api/recipes/'))
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            REPLICA_DB_ALIAS.encode()
+        )
+
+    async def test_async_request_reads_from_replica(self):
+        async def view(request):
+            self.databases_used.append(router.db_for_read(Recipe))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        await middleware(self.factory.get('/api/recipes/'))
+        await middleware(self.factory.post('/api/recipes/'))
+        self.assertEqual(
+            self.databases_used,
+            [REPLICA_DB_ALIAS, DEFAULT_DB_ALIAS]
+        )
@@ -0,0 +1,94 @@
+"""Прогрев приложения в главном процессе gunicorn перед запуском воркеров.
+
+Воркеры наследуют прогретую память через fork и делят её страницы,
+пока не изменят их.
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import close_caches
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+from django.utils import translation
+
+from api.serializers import (
+    AuthorSerializer,
+    BulkRecipesSerializer,
+    FollowSerializer,
+    IngredientSerializer,
+    RecipeCreateSerializer,
+    RecipeSerializer,
+    RecipeShortSerializer,
+    TagSerializer,
+    UserCreateSerializer,
+    UserSerializer
+)
+from recipes.ingredient_index import ingredient_index
+
+logger = logging.getLogger(__name__)
+
+SERIALIZERS = (
+    AuthorSerializer,
+    BulkRecipesSerializer,
+    FollowSerializer,
+    IngredientSerializer,
+    RecipeCreateSerializer,
+    RecipeSerializer,
+    RecipeShortSerializer,
+    TagSerializer,
+    UserCreateSerializer,
+    UserSerializer,
+)
+WARM_UP_PATHS = ('/api/tags/', '/api/ingredients/', '/api/recipes/')
+
+
+def warm_up_code():
+    """Метаданные моделей, маршруты, переводы и поля сериализаторов."""
+    for model in apps.get_models():
+        model._meta.get_fields()
+    reverse('api:recipes-list')
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+    for serializer_class in SERIALIZERS:
+        serializer_class().fields
+
+
+def warm_up_data():
+    """Индекс ингредиентов и ответы справочников и списка рецептов.
+
+    Представления вызываются напрямую, без middleware: прогрев не
+    попадает в метрики запросов.
+    """
+    ingredient_index.all()
+    factory = RequestFactory()
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+    ):
+        for path in WARM_UP_PATHS:
+            match = resolve(path)
+            view = getattr(match.func, '__wrapped__', match.func)
+            response = view(factory.get(path), *match.args, **match.kwargs)
+            response.render()
+
+
+def warm_up():
+    """Прогревает приложение и закрывает соединения перед fork.
+
+    Соединения с базой и кешем не должны достаться воркерам
+    по наследству. Ошибки данных, например на ещё не
+    мигрированной базе, не мешают запуску.
+    """
+    start = time.monotonic()
+    warm_up_code()
+    try:
+        warm_up_data()
+    except Exception:
+        logger.warning('Данные не прогреты', exc_info=True)
+    finally:
+        connections.close_all()
+        close_caches()
+    return time.monotonic() - start
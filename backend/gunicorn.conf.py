@@ -0,0 +1,87 @@
+"""Настройки gunicorn: предзагрузка, прогрев и метрики воркеров.
+
+С GUNICORN_PRELOAD=True приложение загружается и прогревается
+в главном процессе, после чего gc.freeze() переносит объекты
+в постоянное поколение сборщика мусора. Сборщик не трогает их
+в воркерах, и страницы памяти остаются общими после fork.
+"""
+import gc
+import glob
+import os
+import time
+
+STARTED = time.monotonic()
+
+# Адрес и число воркеров меняются только явно: без переменных действуют
+# --bind из команды запуска и значение gunicorn по умолчанию (1 воркер).
+if os.getenv('GUNICORN_BIND'):
+    bind = os.environ['GUNICORN_BIND']
+if os.getenv('GUNICORN_WORKERS'):
+    workers = int(os.environ['GUNICORN_WORKERS'])
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+warm_up = os.getenv('GUNICORN_WARM_UP', 'True').lower() == 'true'
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def memory_usage():
+    """RSS и неразделяемая память процесса в МБ по /proc/self/smaps_rollup."""
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Private_Clean', 'Private_Dirty'):
+                    usage[name] = int(value.split()[0]) / 1024
+    except OSError:
+        return 'недоступно'
+    private = usage.get('Private_Clean', 0) + usage.get('Private_Dirty', 0)
+    return f'RSS {usage.get("Rss", 0):.1f} МБ, собственная {private:.1f} МБ'
+
+
+def on_starting(server):
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        os.remove(path)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        if warm_up:
+            from foodgram.warmup import warm_up as warm_up_app
+
+            server.log.info('Прогрев занял %.2f с', warm_up_app())
+        gc.freeze()
+    server.log.info(
+        'Главный процесс готов за %.2f с, %s',
+        time.monotonic() - STARTED,
+        memory_usage()
+    )
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    worker.started = time.monotonic()
+
+
+def post_worker_init(worker):
+    worker.log.info(
+        'Воркер %s готов за %.2f с, %s',
+        worker.pid,
+        time.monotonic() - worker.started,
+        memory_usage()
+    )
+
+
+def worker_exit(server, worker):
+    server.log.info('Воркер %s завершается, %s', worker.pid, memory_usage())
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from .jobs import enqueue
 from .models import (
     Tag,
     Ingredient,
@@ -7,7 +8,10 @@ from .models import (
     RecipeIngredient,
     Follow,
     FavoriteRecipe,
-    ShoppingCart
+    Job,
+    ShoppingCart,
+    ShoppingListItem,
+    User
 )
 
 admin.site.empty_value_display = 'Не задано'
@@ -16,6 +20,7 @@ admin.site.empty_value_display = 'Не задано'
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -57,6 +62,7 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit'
     )
+    ordering = ('name',)
 
 
 class RecipeAdmin(admin.ModelAdmin):
@@ -64,7 +70,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'id',
         'author',
         'name',
-        'total_favorite',
+        'favorites_count',
         'image',
         'text',
         'cooking_time'
@@ -87,10 +93,19 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = (RecipeIngredientInline,)
 
-    def total_favorite(self, obj):
-        return obj.total_favorite
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            enqueue('process_recipe_image', recipe_id=obj.pk)
 
-    total_favorite.short_description = 'Уже в избранном'
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            enqueue('rebuild_shopping_lists', user_ids=list(
+                User.objects.filter(
+                    cart_recipes__recipe=form.instance
+                ).values_list('id', flat=True)
+            ))
 
 
 class FollowAdmin(admin.ModelAdmin):
@@ -117,9 +132,35 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'total_amount'
+    )
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'task',
+        'status',
+        'attempts',
+        'run_after',
+        'created'
+    )
+    list_filter = (
+        'status',
+        'task'
+    )
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(FavoriteRecipe, FavoriteRecipeAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,50 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import CatalogVersion
+
+CATALOG_VERSION_KEY = 'catalog-version:{}'
+INGREDIENTS = 'ingredient'
+TAGS = 'tag'
+
+
+def _new_version():
+    return {'etag': uuid.uuid4().hex, 'modified': timezone.now()}
+
+
+def get_catalog_version(name):
+    """Версия справочника (тегов или ингредиентов).
+
+    Версия хранится в базе и меняется при любом изменении строк
+    справочника. Кеш Django только избавляет от запроса к базе:
+    вытеснение записи из кеша не меняет ETag и ключи кеша рецептов.
+    """
+    key = CATALOG_VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        row, _ = CatalogVersion.objects.get_or_create(
+            name=name,
+            defaults=_new_version()
+        )
+        version = {'etag': row.etag, 'modified': row.modified}
+        cache.add(key, version, settings.CATALOG_VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_catalog_version(name):
+    """Новая версия справочника; кеш обновляется после фиксации.
+
+    Процесс, прочитавший из базы старую версию до фиксации, не
+    перезапишет новую: при промахе версия кладётся в кеш через add().
+    """
+    version = _new_version()
+    CatalogVersion.objects.update_or_create(name=name, defaults=version)
+    transaction.on_commit(lambda: cache.set(
+        CATALOG_VERSION_KEY.format(name),
+        version,
+        settings.CATALOG_VERSION_CACHE_TIMEOUT
+    ))
@@ -0,0 +1,125 @@
+import base64
+import binascii
+from io import BytesIO
+from pathlib import PurePath
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from recipes.models import RECIPE_THUMBNAIL_FIELDS, Recipe
+
+BASE64_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+IMAGE_EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+class ImageError(ValueError):
+    """Изображение не прошло проверку."""
+
+
+def decode_base64_image(data, name):
+    """Декодирует base64 частями во временный файл.
+
+    Размер проверяется до декодирования, размеры в пикселях — по
+    заголовку файла, без распаковки всего изображения.
+    """
+    if len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_BYTES:
+        raise ImageError('Изображение слишком большое.')
+    # Длина куска кратна 4, поэтому куски декодируются независимо.
+    chunk_size = BASE64_CHUNK_SIZE - BASE64_CHUNK_SIZE % 4
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        for start in range(0, len(data), chunk_size):
+            file.write(base64.b64decode(data[start:start + chunk_size]))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ImageError('Некорректные данные изображения.')
+    file.seek(0)
+    check_image_dimensions(file)
+    file.seek(0)
+    return File(file, name=name)
+
+
+def check_image_dimensions(file):
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ImageError('Файл не является изображением.')
+    max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+    if width > max_dimension or height > max_dimension:
+        raise ImageError(
+            f'Изображение больше {max_dimension}x{max_dimension} пикселей.'
+        )
+
+
+def _encode(image, size):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    image_format = settings.RECIPE_IMAGE_FORMAT
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format=image_format,
+        quality=settings.RECIPE_IMAGE_QUALITY
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def process_recipe_image(recipe):
+    """Перекодирует изображение рецепта и создаёт миниатюры.
+
+    Пока изображение обрабатывается, рецепт могут изменить. Новые файлы
+    записываются, только если в базе осталось то же изображение, иначе
+    удаляются: новое изображение обработает своя задача.
+    """
+    if not recipe.image:
+        return
+    source_name = recipe.image.name
+    stem = PurePath(recipe.image.name).stem
+    extension = IMAGE_EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+    old_names = {recipe.image.name} | {
+        getattr(recipe, field).name
+        for field in RECIPE_THUMBNAIL_FIELDS.values()
+        if getattr(recipe, field)
+    }
+    with recipe.image.open('rb'), Image.open(recipe.image) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands()
+                                  else 'RGB')
+        recipe.image.save(
+            f'{stem}.{extension}',
+            _encode(image, settings.RECIPE_IMAGE_SIZE),
+            save=False
+        )
+        for size_name, field in RECIPE_THUMBNAIL_FIELDS.items():
+            getattr(recipe, field).save(
+                f'{stem}_{size_name}.{extension}',
+                _encode(image, settings.RECIPE_THUMBNAIL_SIZES[size_name]),
+                save=False
+            )
+    names = {'image': recipe.image.name}
+    for field in RECIPE_THUMBNAIL_FIELDS.values():
+        names[field] = getattr(recipe, field).name
+    recipe.updated = timezone.now()
+    updated = Recipe.objects.filter(pk=recipe.pk, image=source_name).update(
+        updated=recipe.updated,
+        **names
+    )
+    storage = recipe.image.storage
+    if updated:
+        unused = old_names - set(names.values())
+    else:
+        unused = set(names.values()) - old_names
+    for name in unused:
+        storage.delete(name)
@@ -0,0 +1,83 @@
+import threading
+from bisect import bisect_left
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+
+from recipes.catalog import (
+    INGREDIENTS,
+    bump_catalog_version,
+    get_catalog_version
+)
+from recipes.models import Ingredient
+
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Имена хранятся в отсортированном списке, поиск по началу строки
+    выполняется через bisect. Совпадения по началу имени идут первыми,
+    затем совпадения по подстроке. Индекс пересобирается, когда меняется
+    версия справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Версия, ключи и записи публикуются одним присваиванием, поэтому
+        # поток всегда читает согласованные между собой ключи и записи.
+        self._index: Tuple[Optional[str], List[str], List[dict]] = (
+            None, [], []
+        )
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda ingredient: (
+                ingredient['name'].casefold(), ingredient['id']
+            )
+        )
+        keys = [ingredient['name'].casefold() for ingredient in ingredients]
+        return version, keys, ingredients
+
+    def _current(self):
+        """Ключи и записи индекса текущей версии справочника."""
+        version = get_catalog_version(INGREDIENTS)['etag']
+        index = self._index
+        if index[0] != version:
+            with self._lock:
+                index = self._index
+                if index[0] != version:
+                    index = self._build(version)
+                    self._index = index
+        return index[1], index[2]
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах, разделяющих кеш."""
+        bump_catalog_version(INGREDIENTS)
+        self._index = (None, [], [])
+
+    def all(self) -> List[dict]:
+        return self._current()[1]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[dict]:
+        """Ингредиенты, имя которых начинается с query или содержит его."""
+        keys, items = self._current()
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + PREFIX_UPPER_BOUND, start)
+        result = items[start:min(end, start + limit)]
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if start <= position < end or query not in key:
+                    continue
+                result.append(items[position])
+                if len(result) == limit:
+                    break
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,118 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from recipes.models import Job
+
+logger = logging.getLogger(__name__)
+
+PRUNE_BATCH_SIZE = 1000
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    """Ставит задачу в очередь или выполняет её сразу.
+
+    Задача записывается в текущей транзакции, поэтому обработчик увидит
+    её только вместе с изменениями, которые её породили.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Неизвестная задача: {name}')
+    if not settings.JOBS_ASYNC:
+        TASKS[name](**payload)
+        return None
+    return Job.objects.create(task=name, payload=payload)
+
+
+def claim_jobs(limit):
+    """Забирает до limit готовых задач, пропуская занятые другими."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.PENDING, run_after__lte=now)
+                | Q(status=Job.RUNNING, started__lt=stale)
+            )
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids).update(
+            status=Job.RUNNING,
+            started=now,
+            attempts=F('attempts') + 1
+        )
+    return ids
+
+
+def retry_or_fail(job, error):
+    """Откладывает повтор задачи или, если попытки кончились, завершает."""
+    job.error = error
+    if job.attempts < settings.JOBS_MAX_ATTEMPTS:
+        job.status = Job.PENDING
+        job.run_after = timezone.now() + timedelta(
+            seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+        )
+    else:
+        job.status = Job.FAILED
+    job.save(update_fields=['status', 'run_after', 'error'])
+
+
+def execute_job(job_id):
+    """Выполняет задачу и записывает результат."""
+    job = Job.objects.get(pk=job_id)
+    try:
+        TASKS[job.task](**job.payload)
+    except Exception:
+        logger.exception('Задача %s #%s завершилась ошибкой', job.task, job.pk)
+        retry_or_fail(job, traceback.format_exc())
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, error='')
+    return True
+
+
+def release_jobs(job_ids, error):
+    """Возвращает в очередь задачи, выполнение которых прервалось.
+
+    Задачи, которые успели завершиться, не меняются.
+    """
+    with transaction.atomic():
+        jobs = Job.objects.select_for_update().filter(
+            id__in=job_ids,
+            status=Job.RUNNING
+        )
+        for job in jobs:
+            retry_or_fail(job, error)
+
+
+def prune_jobs():
+    """Удаляет завершённые задачи старше JOBS_RETENTION секунд.
+
+    Выполненные и окончательно упавшие задачи удаляются частями,
+    чтобы не держать долгую блокировку. Возвращает их число.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_RETENTION)
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        started__lt=cutoff
+    )
+    deleted = 0
+    while True:
+        ids = list(finished.values_list('id', flat=True)[:PRUNE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
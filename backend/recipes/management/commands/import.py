@@ -1,25 +1,117 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
+from recipes.ingredient_index import ingredient_index
 from recipes.models import Ingredient
 
+DEFAULT_PATH = 'data/ingredients.csv'
+BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield {'name': row[0], 'measurement_unit': row[1]}
+
+
+def read_json(file):
+    """Построчно отдаёт объекты из JSON-массива, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Файл JSON обрезан.')
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
 
 class Command(BaseCommand):
     help = 'Загрузка ингредиентов в базу данных.'
 
-    def handle(self, *args, **options):
-        ingredients_list = []
-        file_path = 'data/ingredients.csv'
-        with open(file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                ingredient = Ingredient(
-                    name=row['абрикосовое варенье'],
-                    measurement_unit=row['г']
-                )
-                ingredients_list.append(ingredient)
-            Ingredient.objects.bulk_create(ingredients_list)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=DEFAULT_PATH,
+            help='Файл CSV или JSON, по умолчанию data/ingredients.csv.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число строк в одной вставке.'
+        )
 
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_absolute() and not path.exists():
+            path = settings.BASE_DIR / path
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+        before = Ingredient.objects.count()
+        started = time.perf_counter()
+        rows = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            items = READERS[file_format](file)
+            while True:
+                batch = [
+                    Ingredient(
+                        name=item['name'].strip(),
+                        measurement_unit=item['measurement_unit'].strip()
+                    )
+                    for item in islice(items, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                rows += len(batch)
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - before
+        ingredient_index.invalidate()
+        self.stdout.write(
+            f'Обработано строк: {rows}, добавлено: {created}, '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с.'
+        )
         self.stdout.write(
             self.style.SUCCESS('Данные успешно загружены.'))
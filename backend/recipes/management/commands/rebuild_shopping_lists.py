@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт или сверка итогов списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить итоги и вывести расхождения.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            help='id пользователя; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        users = options['user']
+        items = ShoppingListItem.objects.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in items.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )
+        }
+        expected = ShoppingListItem.objects.expected_totals(users)
+        missing = expected.keys() - actual.keys()
+        extra = actual.keys() - expected.keys()
+        wrong = {
+            key for key in expected.keys() & actual.keys()
+            if expected[key] != actual[key]
+        }
+        self.stdout.write(
+            f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+            f'с неверной суммой: {len(wrong)}.'
+        )
+        if options['check']:
+            return
+        if missing or extra or wrong:
+            ShoppingListItem.objects.rebuild(users)
+        self.stdout.write(
+            self.style.SUCCESS('Списки покупок пересчитаны.'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipe, Follow, Recipe, ShoppingCart
+from users.models import User
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+)
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос с числом связанных записей для каждой строки."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{related_field: OuterRef('pk')})
+        .order_by()
+        .values(related_field)
+        .annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счётчиков рецептов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счётчики и вывести расхождения.'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            count = actual_count(related_model, related_field)
+            drifted = list(
+                model.objects.annotate(actual=count)
+                .exclude(**{field: F('actual')})
+                .values_list('pk', flat=True)
+            )
+            if drifted and not options['check']:
+                # Значение пересчитывается в самом UPDATE, поэтому
+                # изменения между сверкой и записью не теряются.
+                model.objects.filter(pk__in=drifted).update(**{field: count})
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}, {field}: '
+                f'расхождений {len(drifted)}.'
+            )
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS('Счётчики исправлены.'))
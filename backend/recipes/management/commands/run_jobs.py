@@ -0,0 +1,135 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.jobs import claim_jobs, execute_job, prune_jobs, release_jobs
+from recipes.worker import init_process, run_job
+
+POLL_INTERVAL = 1.0
+PRUNE_INTERVAL = 60 * 60
+BROKEN_POOL_ERROR = 'Процесс обработчика аварийно завершился.'
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Число процессов; 0 — выполнять задачи в этом процессе.'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунды.'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        self.once = options['once']
+        self.poll_interval = options['poll_interval']
+        processes = options['processes']
+        self.done = self.failed = 0
+        self.pruned_at = None
+        try:
+            if processes > 0:
+                self.run_pool(processes)
+            else:
+                self.run_inline()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {self.done}, с ошибкой: {self.failed}.'
+        ))
+
+    def count(self, succeeded):
+        if succeeded:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def idle(self):
+        """Пустая очередь: раз в PRUNE_INTERVAL удаляет старые задачи.
+
+        Возвращает True, если обработчик должен завершиться.
+        """
+        now = time.monotonic()
+        if self.pruned_at is None or now - self.pruned_at >= PRUNE_INTERVAL:
+            self.pruned_at = now
+            pruned = prune_jobs()
+            if pruned:
+                self.stdout.write(f'Удалено старых задач: {pruned}.')
+        if self.once:
+            return True
+        time.sleep(self.poll_interval)
+        return False
+
+    def run_inline(self):
+        while True:
+            job_ids = claim_jobs(1)
+            if not job_ids:
+                if self.idle():
+                    return
+                continue
+            self.count(execute_job(job_ids[0]))
+
+    def run_pool(self, processes):
+        # Новые процессы запускаются через spawn и открывают собственные
+        # соединения с базой, а не наследуют сокеты родителя.
+        context = multiprocessing.get_context('spawn')
+        while True:
+            claimed = set()
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=processes,
+                    mp_context=context,
+                    initializer=init_process
+                ) as pool:
+                    self.serve_pool(pool, processes, claimed)
+                return
+            except BrokenProcessPool:
+                # Процесс пула убит (например, при нехватке памяти), и
+                # пул больше не принимает задачи. Незавершённые задачи
+                # возвращаются в очередь, пул создаётся заново.
+                self.stderr.write(
+                    f'{BROKEN_POOL_ERROR} Прервано задач: {len(claimed)}.'
+                )
+                release_jobs(claimed, BROKEN_POOL_ERROR)
+                self.failed += len(claimed)
+
+    def serve_pool(self, pool, processes, claimed):
+        """Раздаёт задачи процессам пула.
+
+        В claimed — id взятых из очереди и ещё не завершённых задач.
+        """
+        running = {}
+        while True:
+            free = processes - len(running)
+            job_ids = claim_jobs(free) if free else []
+            claimed.update(job_ids)
+            connections.close_all()
+            for job_id in job_ids:
+                running[pool.submit(run_job, job_id)] = job_id
+            if not running:
+                if self.idle():
+                    return
+                continue
+            finished, _ = wait(
+                running,
+                timeout=self.poll_interval,
+                return_when=FIRST_COMPLETED
+            )
+            for future in finished:
+                self.count(future.result())
+                claimed.discard(running.pop(future))
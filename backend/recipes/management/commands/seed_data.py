@@ -0,0 +1,254 @@
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import (
+    FavoriteRecipe,
+    Follow,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag
+)
+from users.models import User
+
+USERNAME_PREFIX = 'seed_'
+PASSWORD = 'seed-password'
+IMAGE_NAME = 'recipes/images/seed.webp'
+BATCH_SIZE = 1000
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F7C948', 'dessert'),
+    ('Выпечка', '#C0784A', 'baking'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'омлет',
+    'паста', 'котлеты', 'блины', 'плов', 'рулет', 'соус', 'торт',
+    'овощной', 'куриный', 'грибной', 'сырный', 'рыбный', 'домашний',
+    'быстрый', 'летний', 'острый', 'сладкий', 'бабушкин', 'пряный',
+)
+PUB_DATE_SPREAD_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетические данные для нагрузочных замеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=10,
+            help='Рецептов на пользователя в среднем.'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=8,
+            help='Ингредиентов на рецепт в среднем.'
+        )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Избранных рецептов на пользователя.'
+        )
+        parser.add_argument(
+            '--carts',
+            type=int,
+            default=5,
+            help='Рецептов в корзине на пользователя.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее созданных синтетических пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните python manage.py import'
+            )
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=USERNAME_PREFIX
+            ).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}.')
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            users = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                users,
+                options['recipes'],
+                options['ingredients'],
+                ingredient_ids,
+                tag_ids
+            )
+            self.create_relations(
+                Follow, 'following_id', users, [user.pk for user in users],
+                options['follows'], exclude_self=True
+            )
+            self.create_relations(
+                FavoriteRecipe, 'recipe_id', users, recipe_ids,
+                options['favorites']
+            )
+            self.create_relations(
+                ShoppingCart, 'recipe_id', users, recipe_ids,
+                options['carts']
+            )
+            Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
+            ShoppingListItem.objects.rebuild(users)
+            call_command('reconcile_counters', stdout=io.StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, '
+            f'рецептов: {len(recipe_ids)}. Пароль: {PASSWORD}'
+        ))
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug,
+                defaults={'name': name, 'color': color}
+            )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        password = make_password(PASSWORD)
+        usernames = [
+            f'{USERNAME_PREFIX}{number}'
+            for number in range(start, start + count)
+        ]
+        User.objects.bulk_create(
+            [
+                User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    first_name='Тест',
+                    last_name=username,
+                    password=password
+                )
+                for username in usernames
+            ],
+            batch_size=BATCH_SIZE
+        )
+        return list(User.objects.filter(username__in=usernames))
+
+    def create_image(self):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new('RGB', (640, 480), '#D9A066').save(buffer, 'WEBP')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(self, users, per_user, per_recipe, ingredient_ids,
+                       tag_ids):
+        image = self.create_image()
+        recipes = []
+        for user in users:
+            for _ in range(self.random.randint(0, per_user * 2)):
+                name = ' '.join(self.random.sample(WORDS, 3)).capitalize()
+                recipes.append(Recipe(
+                    author=user,
+                    name=name,
+                    text=f'{name}. ' * self.random.randint(3, 30),
+                    cooking_time=self.random.randint(5, 240),
+                    image=image,
+                    image_small=image,
+                    image_medium=image
+                ))
+        Recipe.objects.bulk_create(recipes, batch_size=BATCH_SIZE)
+        created = list(
+            Recipe.objects.filter(author__in=users).only('id', 'pub_date')
+        )
+        now = timezone.now()
+        for recipe in created:
+            recipe.pub_date = now - timedelta(
+                seconds=self.random.randint(
+                    0, PUB_DATE_SPREAD_DAYS * 24 * 60 * 60
+                )
+            )
+        Recipe.objects.bulk_update(
+            created,
+            ['pub_date'],
+            batch_size=BATCH_SIZE
+        )
+        recipe_ids = [recipe.pk for recipe in created]
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids,
+                    min(
+                        len(ingredient_ids),
+                        self.random.randint(1, per_recipe * 2)
+                    )
+                )
+            ],
+            batch_size=BATCH_SIZE
+        )
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+                )
+            ],
+            batch_size=BATCH_SIZE
+        )
+        return recipe_ids
+
+    def create_relations(self, model, field, users, targets, per_user,
+                         exclude_self=False):
+        """Связи пользователей с популярными целями чаще, чем с прочими."""
+        if not targets:
+            return
+        targets = self.random.sample(targets, len(targets))
+        weights = [1 / (rank + 1) for rank in range(len(targets))]
+        relations = []
+        for user in users:
+            chosen = set(self.random.choices(
+                targets, weights=weights, k=per_user
+            ))
+            if exclude_self:
+                chosen.discard(user.pk)
+            relations.extend(
+                model(user=user, **{field: target}) for target in chosen
+            )
+        model.objects.bulk_create(
+            relations,
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
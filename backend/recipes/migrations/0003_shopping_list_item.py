@@ -0,0 +1,74 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:12
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """Итоги по корзинам, собранным до появления списков покупок.
+
+    Повторяющиеся записи корзины учитываются один раз: их удаляет
+    0011_remove_duplicate_relations.
+    """
+    alias = schema_editor.connection.alias
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    carts = set(
+        ShoppingCart.objects.using(alias).values_list('user_id', 'recipe_id')
+    )
+    recipe_amounts = defaultdict(list)
+    for recipe_id, ingredient_id, amount in (
+        RecipeIngredient.objects.using(alias)
+        .filter(recipe_id__in={recipe_id for _, recipe_id in carts})
+        .values_list('recipe_id', 'ingredient_id', 'amount')
+    ):
+        recipe_amounts[recipe_id].append((ingredient_id, amount))
+    totals = defaultdict(int)
+    for user_id, recipe_id in carts:
+        for ingredient_id, amount in recipe_amounts[recipe_id]:
+            totals[user_id, ingredient_id] += amount
+    ShoppingListItem.objects.using(alias).bulk_create(
+        [
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total
+            )
+            for (user_id, ingredient_id), total in totals.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списков покупок',
+                'ordering': ['user_id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique shopping list ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:21
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'recipes', 'Follow', 'following'),
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'FavoriteRecipe',
+     'recipe'),
+    ('recipes', 'Recipe', 'in_carts_count', 'recipes', 'ShoppingCart',
+     'recipe'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    for app, model, field, related_app, related_model, related_field in (
+            COUNTERS):
+        Related = apps.get_model(related_app, related_model)
+        count = Subquery(
+            Related.objects.filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        )
+        apps.get_model(app, model).objects.using(alias).update(
+            **{field: Coalesce(count, 0)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_job'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
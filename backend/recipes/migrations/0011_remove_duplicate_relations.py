@@ -0,0 +1,55 @@
+from django.db import migrations
+from django.db.models import (
+    Count,
+    F,
+    IntegerField,
+    Min,
+    OuterRef,
+    Subquery
+)
+from django.db.models.functions import Coalesce
+
+RELATIONS = (
+    ('FavoriteRecipe', 'recipe', 'recipes', 'Recipe', 'favorites_count'),
+    ('ShoppingCart', 'recipe', 'recipes', 'Recipe', 'in_carts_count'),
+    ('Follow', 'following', 'users', 'User', 'followers_count'),
+)
+
+
+def remove_duplicates(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Follow = apps.get_model('recipes', 'Follow')
+    Follow.objects.using(alias).filter(user=F('following')).delete()
+    for model, field, target_app, target_model, counter in RELATIONS:
+        Relation = apps.get_model('recipes', model)
+        relations = Relation.objects.using(alias)
+        first_ids = (
+            relations.order_by()
+            .values('user', field)
+            .annotate(first_id=Min('id'))
+            .values('first_id')
+        )
+        relations.exclude(id__in=Subquery(first_ids)).delete()
+        count = Subquery(
+            Relation.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        )
+        apps.get_model(target_app, target_model).objects.using(alias).update(
+            **{counter: Coalesce(count, 0)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_author_pub_date_index'),
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
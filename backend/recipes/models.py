@@ -1,6 +1,23 @@
+from collections import Counter, defaultdict
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    OuterRef,
+    Q,
+    Sum,
+    Value,
+    When
+)
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -8,6 +25,120 @@ COOKING_TIME_ANF_AMOUNT_MIN = 1
 COOKING_TIME_ANF_AMOUNT_MAX = 3200
 CHARFIELD_MAX_LENGTH = 200
 COLOR_MAX_LENGTH = 7
+SHOPPING_LIST_BATCH_SIZE = 1000
+SEARCH_CONFIG = 'russian'
+RECIPE_THUMBNAIL_FIELDS = {
+    'small': 'image_small',
+    'medium': 'image_medium',
+}
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно меняет счётчик на delta, не опуская его ниже нуля."""
+    return queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def group_by_user(pairs):
+    """Пары (пользователь, объект) в словарь {пользователь: [объекты]}."""
+    grouped = defaultdict(list)
+    for user_id, target_id in pairs:
+        grouped[user_id].append(target_id)
+    return grouped
+
+
+class RelationQuerySet(models.QuerySet):
+
+    def _delete_pairs(self):
+        with transaction.atomic(using=self.db):
+            pairs = list(
+                self.select_for_update()
+                .values_list('user_id', f'{self.model.target_field}_id')
+            )
+            result = super().delete()
+            self.model.relations_removed(pairs)
+        return result, pairs
+
+    def delete(self):
+        """Удаляет связи и сообщает модели удалённые пары.
+
+        QuerySet.delete() не вызывает delete() модели, в том числе при
+        массовом удалении из админки, поэтому зависящие от связей данные
+        обновляются здесь, в relations_removed модели.
+        """
+        result, _ = self._delete_pairs()
+        return result
+
+    def remove(self):
+        """Удаляет связи, как delete(), и возвращает удалённые пары."""
+        _, pairs = self._delete_pairs()
+        return pairs
+
+
+class CountedRelation(models.Model):
+    """Связь пользователя с объектом, у которого есть счётчик таких связей.
+
+    Счётчик меняется при сохранении и удалении связи, при массовом
+    удалении через RelationQuerySet и при массовой вставке, если после
+    неё вызвать relations_added.
+    """
+    target_field = None
+    counter_field = None
+
+    objects = RelationQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_pair = (
+            instance.__dict__.get('user_id'),
+            instance.__dict__.get(f'{cls.target_field}_id')
+        )
+        return instance
+
+    @property
+    def pair(self):
+        return self.user_id, getattr(self, f'{self.target_field}_id')
+
+    @classmethod
+    def change_counters(cls, pairs, sign):
+        """Меняет счётчики одним UPDATE на каждое число связей."""
+        targets = Counter(target_id for _, target_id in pairs)
+        by_count = defaultdict(list)
+        for target_id, count in targets.items():
+            by_count[count].append(target_id)
+        target_model = cls._meta.get_field(cls.target_field).related_model
+        for count, target_ids in by_count.items():
+            change_counter(
+                target_model.objects.filter(pk__in=target_ids),
+                cls.counter_field,
+                sign * count
+            )
+
+    @classmethod
+    def relations_added(cls, pairs):
+        cls.change_counters(pairs, 1)
+
+    @classmethod
+    def relations_removed(cls, pairs):
+        cls.change_counters(pairs, -1)
+
+    def save(self, *args, **kwargs):
+        saved_pair = getattr(self, '_saved_pair', None)
+        super().save(*args, **kwargs)
+        if saved_pair != self.pair:
+            if saved_pair is not None:
+                self.relations_removed([saved_pair])
+            self.relations_added([self.pair])
+            self._saved_pair = self.pair
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if result[0]:
+            self.relations_removed([self._saved_pair or self.pair])
+        return result
 
 
 class Ingredient(models.Model):
@@ -21,7 +152,6 @@ class Ingredient(models.Model):
     )
 
     class Meta:
-        ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         constraints = [
@@ -63,6 +193,36 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами избранного, корзины и подписки."""
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                favorited=false,
+                in_shopping_cart=false,
+                author_subscribed=false
+            )
+        return self.annotate(
+            favorited=Exists(FavoriteRecipe.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            author_subscribed=Exists(Follow.objects.filter(
+                following=OuterRef('author'), user=user))
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор по названию и описанию."""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        ))
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -72,7 +232,8 @@ class Recipe(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
-        verbose_name='Автор рецепта'
+        verbose_name='Автор рецепта',
+        db_index=False
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -87,6 +248,18 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipes/images/'
     )
+    image_small = models.ImageField(
+        verbose_name='Миниатюра',
+        upload_to='recipes/thumbnails/',
+        blank=True,
+        editable=False
+    )
+    image_medium = models.ImageField(
+        verbose_name='Изображение для списка',
+        upload_to='recipes/thumbnails/',
+        blank=True,
+        editable=False
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -101,32 +274,93 @@ class Recipe(models.Model):
         verbose_name='Дата создания',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+            GinIndex(
+                fields=['name'],
+                name='recipe_name_trgm_idx',
+                opclasses=['gin_trgm_ops']
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_author_id = instance.__dict__.get('author_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        saved_author_id = getattr(self, '_saved_author_id', None)
+        super().save(*args, **kwargs)
+        Recipe.objects.filter(pk=self.pk).update_search_vector()
+        if saved_author_id != self.author_id:
+            if saved_author_id is not None:
+                change_counter(
+                    User.objects.filter(pk=saved_author_id),
+                    'recipes_count',
+                    -1
+                )
+            change_counter(
+                User.objects.filter(pk=self.author_id),
+                'recipes_count',
+                1
+            )
+            self._saved_author_id = self.author_id
+
     def is_in_shopping_cart(self, user):
         return self.recipe_cart.filter(user=user).exists()
 
     def is_favorited(self, user):
         return self.recipe_favorites.filter(user=user).exists()
 
-    @property
-    def total_favorite(self):
-        return self.recipe_favorites.all().count()
-
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         related_name='recipe_ingredients',
         verbose_name='Рецепт',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -143,17 +377,24 @@ class RecipeIngredient(models.Model):
 
     class Meta:
         ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                name='recipe_ingredient_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.ingredient}'
 
 
-class Follow(models.Model):
+class Follow(CountedRelation):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follows',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False
     )
     following = models.ForeignKey(
         User,
@@ -162,21 +403,37 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    target_field = 'following'
+    counter_field = 'followers_count'
+
     class Meta:
-        ordering = ['following_id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'user',
+                    'following'
+                ],
+                name='unique follow'
+            ),
+            models.CheckConstraint(
+                check=~Q(user=F('following')),
+                name='no self follow'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} {self.following}'
 
 
-class FavoriteRecipe(models.Model):
+class FavoriteRecipe(CountedRelation):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='favorite_recipes',
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -185,21 +442,33 @@ class FavoriteRecipe(models.Model):
         verbose_name='Рецепт'
     )
 
+    target_field = 'recipe'
+    counter_field = 'favorites_count'
+
     class Meta:
-        ordering = ['recipe_id']
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'user',
+                    'recipe'
+                ],
+                name='unique favorite recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.user}'
 
 
-class ShoppingCart(models.Model):
+class ShoppingCart(CountedRelation):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='cart_recipes',
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -208,10 +477,261 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
     )
 
+    target_field = 'recipe'
+    counter_field = 'in_carts_count'
+
     class Meta:
-        ordering = ['recipe_id']
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'user',
+                    'recipe'
+                ],
+                name='unique shopping cart recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.user}'
+
+    @classmethod
+    def relations_added(cls, pairs):
+        """Прибавляет рецепты из корзин к спискам покупок."""
+        super().relations_added(pairs)
+        for user_id, recipe_ids in group_by_user(pairs).items():
+            ShoppingListItem.objects.add_recipes(user_id, recipe_ids)
+
+    @classmethod
+    def relations_removed(cls, pairs):
+        """Вычитает рецепты, удалённые из корзин, из списков покупок."""
+        super().relations_removed(pairs)
+        for user_id, recipe_ids in group_by_user(pairs).items():
+            ShoppingListItem.objects.remove_recipes(user_id, recipe_ids)
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+
+    def _lock_user(self, user_id):
+        User.objects.select_for_update().filter(pk=user_id).exists()
+
+    def _lock_users(self, users=None):
+        # Порядок по pk исключает взаимную блокировку двух пересчётов.
+        locked = User.objects.select_for_update().order_by('pk')
+        if users is not None:
+            locked = locked.filter(
+                pk__in=[getattr(user, 'pk', user) for user in users]
+            )
+        list(locked.values_list('pk', flat=True))
+
+    def _recipe_amounts(self, recipes):
+        return dict(
+            RecipeIngredient.objects.filter(recipe__in=recipes)
+            .values('ingredient_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+            .values_list('ingredient_id', 'total')
+        )
+
+    @transaction.atomic
+    def add_recipes(self, user_id, recipes):
+        """Прибавляет ингредиенты рецептов к списку покупок пользователя."""
+        amounts = self._recipe_amounts(recipes)
+        if not amounts:
+            return
+        self._lock_user(user_id)
+        items = self.filter(user_id=user_id, ingredient_id__in=amounts)
+        existing = set(items.values_list('ingredient_id', flat=True))
+        if existing:
+            items.update(total_amount=F('total_amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in amounts.items()
+                  if ingredient_id in existing],
+                default=Value(0)
+            ))
+        self.bulk_create([
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       total_amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ])
+
+    @transaction.atomic
+    def remove_recipes(self, user_id, recipes):
+        """Вычитает ингредиенты рецептов из списка покупок пользователя."""
+        amounts = self._recipe_amounts(recipes)
+        if not amounts:
+            return
+        self._lock_user(user_id)
+        items = self.filter(user_id=user_id, ingredient_id__in=amounts)
+        items.update(total_amount=Greatest(F('total_amount') - Case(
+            *[When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()],
+            default=Value(0)
+        ), Value(0)))
+        items.filter(total_amount__lte=0).delete()
+
+    def expected_totals(self, users=None):
+        """Итоги, посчитанные заново по корзинам пользователей."""
+        # Условие на корзину задаётся одним filter(), иначе Django
+        # присоединит таблицу корзин дважды и суммы умножатся.
+        if users is None:
+            recipe_ingredients = RecipeIngredient.objects.filter(
+                recipe__recipe_cart__isnull=False
+            )
+        else:
+            recipe_ingredients = RecipeIngredient.objects.filter(
+                recipe__recipe_cart__user__in=users
+            )
+        return {
+            (row['recipe__recipe_cart__user'], row['ingredient']):
+                row['total']
+            for row in recipe_ingredients
+            .values('recipe__recipe_cart__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        }
+
+    @transaction.atomic
+    def rebuild(self, users=None):
+        """Пересчитывает списки покупок пользователей с нуля.
+
+        Пользователи блокируются, как в add_recipes и remove_recipes:
+        изменение корзины, начатое во время пересчёта, дождётся его
+        конца, а не потеряется и не нарушит уникальность строк.
+        """
+        self._lock_users(users)
+        items = self.all() if users is None else self.filter(user__in=users)
+        items.delete()
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           total_amount=total)
+                for (user_id, ingredient_id), total
+                in self.expected_totals(users).items()
+            ],
+            batch_size=SHOPPING_LIST_BATCH_SIZE
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+        db_index=False
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    'user',
+                    'ingredient'
+                ],
+                name='unique shopping list ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.total_amount}'
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(
+        verbose_name='Задача',
+        max_length=CHARFIELD_MAX_LENGTH
+    )
+    payload = models.JSONField(
+        verbose_name='Параметры',
+        default=dict
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попытки',
+        default=0
+    )
+    run_after = models.DateTimeField(
+        verbose_name='Не раньше',
+        default=timezone.now
+    )
+    started = models.DateTimeField(
+        verbose_name='Начало выполнения',
+        null=True,
+        blank=True
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+    error = models.TextField(
+        verbose_name='Ошибка',
+        blank=True
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'],
+                name='job_status_run_after_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} {self.status}'
+
+
+class CatalogVersion(models.Model):
+    name = models.CharField(
+        verbose_name='Справочник',
+        max_length=CHARFIELD_MAX_LENGTH,
+        primary_key=True
+    )
+    etag = models.CharField(
+        verbose_name='ETag',
+        max_length=32
+    )
+    modified = models.DateTimeField(
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name} {self.etag}'
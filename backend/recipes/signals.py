@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.catalog import TAGS, bump_catalog_version
+from recipes.ingredient_index import ingredient_index
+from recipes.jobs import enqueue
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag,
+    change_counter
+)
+from users.models import User
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    bump_catalog_version(TAGS)
+
+
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    """Вычитает удаляемого пользователя из счётчиков авторов и рецептов.
+
+    Подписки, избранное и корзина удаляются каскадом, минуя delete().
+    """
+    change_counter(
+        User.objects.filter(following__user=instance),
+        'followers_count',
+        -1
+    )
+    change_counter(
+        Recipe.objects.filter(recipe_favorites__user=instance),
+        'favorites_count',
+        -1
+    )
+    change_counter(
+        Recipe.objects.filter(recipe_cart__user=instance),
+        'in_carts_count',
+        -1
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_cart_users(sender, instance, **kwargs):
+    instance.cart_user_ids = list(
+        ShoppingCart.objects.filter(recipe=instance)
+        .values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def release_author_counter(sender, instance, **kwargs):
+    """Вычитает рецепт из счётчика автора при любом способе удаления."""
+    change_counter(
+        User.objects.filter(pk=instance.author_id),
+        'recipes_count',
+        -1
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def rebuild_cart_shopping_lists(sender, instance, **kwargs):
+    """Пересчитывает списки покупок, в корзинах которых был рецепт.
+
+    Корзины удаляются каскадом, минуя delete() модели, при любом способе
+    удаления рецепта: через API, в админке или вместе с автором.
+    """
+    if instance.cart_user_ids:
+        enqueue('rebuild_shopping_lists', user_ids=instance.cart_user_ids)
@@ -0,0 +1,15 @@
+from recipes.images import process_recipe_image
+from recipes.jobs import task
+from recipes.models import Recipe, ShoppingListItem
+
+
+@task('process_recipe_image')
+def process_recipe_image_task(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None:
+        process_recipe_image(recipe)
+
+
+@task('rebuild_shopping_lists')
+def rebuild_shopping_lists_task(user_ids):
+    ShoppingListItem.objects.rebuild(user_ids)
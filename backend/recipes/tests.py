@@ -0,0 +1,230 @@
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from recipes.management.commands.reconcile_counters import (
+    COUNTERS,
+    actual_count
+)
+from recipes.models import (
+    FavoriteRecipe,
+    Follow,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem
+)
+from users.models import User
+
+
+@override_settings(JOBS_ASYNC=False)
+class CountersAndShoppingListTests(TestCase):
+    """Счётчики и списки покупок после любых изменений связей.
+
+    После каждого изменения счётчики совпадают с числом связей, а
+    итоги списков покупок — с пересчитанными по корзинам.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user_{number}',
+                email=f'user_{number}@example.com',
+                password='password'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}',
+                measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        cls.recipes = [
+            cls.create_recipe(cls.users[0], {0: 100, 1: 20}),
+            cls.create_recipe(cls.users[0], {1: 30, 2: 5}),
+            cls.create_recipe(cls.users[1], {2: 10, 3: 1}),
+        ]
+
+    @classmethod
+    def create_recipe(cls, author, amounts):
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image='recipes/images/test.webp'
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=cls.ingredients[index],
+                amount=amount
+            )
+            for index, amount in amounts.items()
+        ])
+        return recipe
+
+    def assertCountersCorrect(self):
+        for model, field, related_model, related_field in COUNTERS:
+            drifted = list(
+                model.objects.annotate(
+                    actual=actual_count(related_model, related_field)
+                )
+                .exclude(**{field: F('actual')})
+                .values_list('pk', field, 'actual')
+            )
+            self.assertEqual(drifted, [], f'{model.__name__}.{field}')
+
+    def assertShoppingListsCorrect(self):
+        totals = {
+            (item.user_id, item.ingredient_id): item.total_amount
+            for item in ShoppingListItem.objects.all()
+        }
+        self.assertEqual(totals, ShoppingListItem.objects.expected_totals())
+
+    def assertConsistent(self):
+        self.assertCountersCorrect()
+        self.assertShoppingListsCorrect()
+
+    def fill_carts(self):
+        for user in self.users:
+            for recipe in self.recipes:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def test_recipes_count_on_create(self):
+        self.assertEqual(
+            [user.recipes_count for user in User.objects.order_by('id')],
+            [2, 1, 0]
+        )
+        self.assertConsistent()
+
+    def test_cart_add_and_remove(self):
+        user = self.users[0]
+        ShoppingCart.objects.create(user=user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=self.recipes[1])
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=user, ingredient=self.ingredients[1]
+            ).total_amount,
+            50
+        )
+        self.assertConsistent()
+        ShoppingCart.objects.get(user=user, recipe=self.recipes[0]).delete()
+        self.assertFalse(
+            ShoppingListItem.objects.filter(
+                user=user, ingredient=self.ingredients[0]
+            ).exists()
+        )
+        self.assertConsistent()
+
+    def test_cart_change_recipe(self):
+        cart = ShoppingCart.objects.create(
+            user=self.users[0], recipe=self.recipes[0]
+        )
+        cart = ShoppingCart.objects.get(pk=cart.pk)
+        cart.recipe = self.recipes[2]
+        cart.save()
+        self.assertConsistent()
+
+    def test_bulk_add(self):
+        pairs = [(self.users[1].pk, recipe.pk) for recipe in self.recipes]
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in pairs
+        ])
+        ShoppingCart.relations_added(pairs)
+        self.assertConsistent()
+
+    def test_queryset_delete(self):
+        self.fill_carts()
+        ShoppingCart.objects.filter(recipe=self.recipes[1]).delete()
+        self.assertConsistent()
+        ShoppingCart.objects.filter(user=self.users[2]).delete()
+        self.assertConsistent()
+
+    def test_recipe_delete_rebuilds_shopping_lists(self):
+        self.fill_carts()
+        self.recipes[1].delete()
+        self.assertConsistent()
+
+    def test_recipe_queryset_delete(self):
+        self.fill_carts()
+        Recipe.objects.filter(author=self.users[0]).delete()
+        self.assertConsistent()
+
+    def test_rebuild(self):
+        self.fill_carts()
+        ShoppingListItem.objects.filter(user=self.users[0]).update(
+            total_amount=1
+        )
+        ShoppingListItem.objects.filter(user=self.users[1]).delete()
+        ShoppingListItem.objects.rebuild([self.users[0], self.users[1]])
+        self.assertShoppingListsCorrect()
+
+    def test_rebuild_after_toggles(self):
+        user = self.users[1]
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingListItem.objects.rebuild([user.pk])
+        ShoppingCart.objects.get(user=user, recipe=self.recipes[1]).delete()
+        ShoppingListItem.objects.rebuild([user.pk])
+        ShoppingCart.objects.create(user=user, recipe=self.recipes[1])
+        ShoppingCart.objects.filter(user=user, recipe=self.recipes[0]).delete()
+        self.assertConsistent()
+        ShoppingListItem.objects.rebuild([user.pk])
+        self.assertConsistent()
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_rebuild_locks_users_first(self):
+        with CaptureQueriesContext(connection) as context:
+            ShoppingListItem.objects.rebuild([self.users[0].pk])
+        queries = [query['sql'] for query in context.captured_queries]
+        locks = [
+            number for number, sql in enumerate(queries)
+            if 'FOR UPDATE' in sql and User._meta.db_table in sql
+        ]
+        deletes = [
+            number for number, sql in enumerate(queries)
+            if sql.startswith('DELETE')
+        ]
+        self.assertTrue(locks)
+        self.assertLess(locks[0], deletes[0])
+
+    def test_favorites_and_follows(self):
+        for user in self.users:
+            FavoriteRecipe.objects.create(user=user, recipe=self.recipes[0])
+            if user != self.users[0]:
+                Follow.objects.create(user=user, following=self.users[0])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipes[0].pk).favorites_count, 3
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.users[0].pk).followers_count, 2
+        )
+        FavoriteRecipe.objects.filter(user=self.users[1]).delete()
+        Follow.objects.get(user=self.users[2]).delete()
+        self.assertConsistent()
+
+    def test_recipe_author_change(self):
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        recipe.author = self.users[2]
+        recipe.save()
+        self.assertEqual(
+            [user.recipes_count for user in User.objects.order_by('id')],
+            [1, 1, 1]
+        )
+        self.assertConsistent()
+
+    def test_user_delete(self):
+        self.fill_carts()
+        FavoriteRecipe.objects.create(
+            user=self.users[0], recipe=self.recipes[2]
+        )
+        Follow.objects.create(user=self.users[0], following=self.users[1])
+        self.users[0].delete()
+        self.assertConsistent()
@@ -0,0 +1,16 @@
+"""Точки входа для процессов обработчика задач.
+
+Модуль не импортирует модели на верхнем уровне: процессы запускаются
+через spawn и загружают его до инициализации Django.
+"""
+import django
+
+
+def init_process():
+    django.setup()
+
+
+def run_job(job_id):
+    from recipes.jobs import execute_job
+
+    return execute_job(job_id)
@@ -22,6 +22,16 @@ class User(AbstractUser):
         choices=ROLE_CHOICES,
         default=USER
     )
+    recipes_count = models.PositiveIntegerField(
+        'Число рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['id']
@@ -39,10 +49,6 @@ class User(AbstractUser):
     def is_user(self):
         return self.role == User.USER
 
-    @property
-    def recipes_count(self):
-        return self.recipes.count()
-
     @property
     def get_user_recipes(self):
         return self.recipes.all()
@@ -0,0 +1,468 @@
+"""Нагрузочный прогон сценариев из postman-коллекции.
+
+Запросы берутся из diploma.postman_collection.json по именам,
+переменные {{...}} подставляются для каждого выполнения сценария.
+Сценарий выбирается случайно с учётом веса, каждый поток работает
+от имени своего пользователя, созданного командой seed_data.
+
+Пример:
+    python load_test.py --concurrency 16 --duration 60 --output run.json
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+COLLECTION = Path(__file__).with_name('diploma.postman_collection.json')
+VARIABLE = re.compile(r'{{(\w+)}}')
+PERCENTILES = (50, 95, 99)
+ERROR_SAMPLE_LENGTH = 300
+INGREDIENT_PREFIX_LENGTH = 2
+
+LOGIN = 'get_token_for_first_user'
+RECIPES = 'get_recipes_list // No Auth'
+INGREDIENTS = 'get_ingredients_list // No Auth'
+FAVORITED = 'get_recipes_list_with_is_favorited_param // User'
+IN_CART = 'get_recipes_list_with_is_in_shopping_cart_param // User'
+
+SCENARIOS = {
+    'browse_feed': (
+        'get_recipes_list // User',
+        'get_recipe_detail // User',
+        'get_subscription_list_with_recipes_limit_param // User',
+    ),
+    'search_ingredients': (
+        'get_ingredients_list_with_name_filter // User',
+    ),
+    'toggle_favorite': (
+        'add_to_favorite // User',
+        'remove_from_favorite // User',
+    ),
+    'download_cart': (
+        'add_to_shopping_cart // User',
+        'download_shopping_cart // User',
+        'remove_from_shopping_cart // User',
+    ),
+}
+DEFAULT_WEIGHTS = {
+    'browse_feed': 60,
+    'search_ingredients': 20,
+    'toggle_favorite': 15,
+    'download_cart': 5,
+}
+
+
+def percentile(values, rank):
+    """Значение перцентиля методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, -(-rank * len(ordered) // 100) - 1)
+    return ordered[index]
+
+
+def collection_requests(items):
+    """Запросы коллекции по именам; при повторе имени берётся первый."""
+    found = {}
+    for item in items:
+        if 'item' in item:
+            for name, request in collection_requests(item['item']).items():
+                found.setdefault(name, request)
+        else:
+            found.setdefault(item['name'], item['request'])
+    return found
+
+
+def render(template, variables):
+    return VARIABLE.sub(lambda match: str(variables[match[1]]), template)
+
+
+class Collection:
+    def __init__(self, path, base_url, timeout):
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+        self.requests = collection_requests(data['item'])
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        missing = {
+            name
+            for steps in SCENARIOS.values() for name in steps
+            if name not in self.requests
+        }
+        if missing:
+            raise SystemExit(
+                f'В коллекции нет запросов: {", ".join(sorted(missing))}'
+            )
+
+    def send(self, session, name, variables):
+        """Выполняет запрос коллекции и возвращает ответ."""
+        request = self.requests[name]
+        variables = {'baseUrl': self.base_url, **variables}
+        headers = {}
+        auth = request.get('auth') or {}
+        if auth.get('type') == 'apikey':
+            fields = {field['key']: field['value'] for field in auth['apikey']}
+            headers[fields['key']] = render(fields['value'], variables)
+        body = (request.get('body') or {}).get('raw') or None
+        if body:
+            body = render(body, variables).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        return session.request(
+            request['method'],
+            render(request['url']['raw'], variables),
+            data=body,
+            headers=headers,
+            timeout=self.timeout
+        )
+
+    def collect(self, session, name, variables, key):
+        """Значения key со всех страниц списка."""
+        response = self.send(session, name, variables)
+        response.raise_for_status()
+        values = []
+        while True:
+            data = response.json()
+            results = data['results'] if isinstance(data, dict) else data
+            values.extend(item[key] for item in results)
+            if not isinstance(data, dict) or not data.get('next'):
+                return values
+            response = session.get(
+                data['next'],
+                headers=response.request.headers,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+
+
+class Stats:
+    """Задержки и ошибки, собранные потоками."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.scenarios = defaultdict(lambda: {'runs': 0, 'failed': 0})
+        self.error_samples = defaultdict(dict)
+
+    def add_request(self, name, elapsed, status, error=None):
+        with self.lock:
+            self.timings[name].append(elapsed)
+            self.statuses[name][status] += 1
+            if error is not None:
+                self.error_samples[name].setdefault(
+                    str(status), error[:ERROR_SAMPLE_LENGTH]
+                )
+
+    def add_scenario(self, name, failed):
+        with self.lock:
+            self.scenarios[name]['runs'] += 1
+            self.scenarios[name]['failed'] += failed
+
+    def report(self, duration):
+        requests_report = {}
+        for name, timings in sorted(self.timings.items()):
+            statuses = self.statuses[name]
+            errors = sum(
+                count for status, count in statuses.items()
+                if not 200 <= status < 400
+            )
+            result = {
+                'requests': len(timings),
+                'rps': round(len(timings) / duration, 2),
+                'errors': errors,
+                'error_rate': round(errors / len(timings), 4),
+                'statuses': {
+                    str(status): count for status, count in statuses.items()
+                },
+                'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+            }
+            if name in self.error_samples:
+                result['error_samples'] = self.error_samples[name]
+            for rank in PERCENTILES:
+                result[f'p{rank}_ms'] = round(
+                    percentile(timings, rank) * 1000, 2
+                )
+            requests_report[name] = result
+        total = sum(len(timings) for timings in self.timings.values())
+        errors = sum(result['errors'] for result in requests_report.values())
+        everything = [
+            elapsed for timings in self.timings.values()
+            for elapsed in timings
+        ]
+        summary = {
+            'duration_s': round(duration, 2),
+            'requests': total,
+            'rps': round(total / duration, 2),
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0,
+        }
+        if everything:
+            for rank in PERCENTILES:
+                summary[f'p{rank}_ms'] = round(
+                    percentile(everything, rank) * 1000, 2
+                )
+        return {
+            'summary': summary,
+            'scenarios': dict(self.scenarios),
+            'requests': requests_report,
+        }
+
+
+class User:
+    """Пользователь нагрузочного прогона с токеном и своими рецептами."""
+
+    def __init__(self, collection, session, email, password):
+        response = collection.send(
+            session,
+            LOGIN,
+            {'email': json.dumps(email), 'password': json.dumps(password)}
+        )
+        if response.status_code != 200:
+            raise SystemExit(
+                f'Не удалось войти как {email}: {response.status_code}. '
+                'Создайте пользователей командой seed_data.'
+            )
+        self.token = response.json()['auth_token']
+        variables = {'userToken': self.token}
+        self.favorited = set(
+            collection.collect(session, FAVORITED, variables, 'id')
+        )
+        self.in_cart = set(
+            collection.collect(session, IN_CART, variables, 'id')
+        )
+
+
+def user_free_recipes(user, recipe_ids):
+    """Рецепты, которых нет ни в избранном, ни в корзине пользователя."""
+    return [
+        recipe_id for recipe_id in recipe_ids
+        if recipe_id not in user.favorited and recipe_id not in user.in_cart
+    ]
+
+
+def assign_threads(users, recipe_ids, concurrency):
+    """Пользователь и рецепты для переключения каждого потока.
+
+    Потоки распределяются по пользователям по кругу, но у пользователя
+    не больше потоков, чем его свободных рецептов. Потоки одного
+    пользователя получают непересекающиеся части этих рецептов, иначе
+    их запросы мешали бы друг другу и давали ответ 400.
+    """
+    free = [user_free_recipes(user, recipe_ids) for user in users]
+    counts = [0] * len(users)
+    owners = []
+    for number in range(concurrency):
+        preferred = number % len(users)
+        if counts[preferred] < len(free[preferred]):
+            index = preferred
+        else:
+            candidates = [
+                index for index in range(len(users))
+                if counts[index] < len(free[index])
+            ]
+            if not candidates:
+                raise SystemExit(
+                    'Свободных рецептов меньше, чем потоков: '
+                    'увеличьте --recipe-pages или --users.'
+                )
+            index = min(candidates, key=lambda index: counts[index])
+        owners.append((index, counts[index]))
+        counts[index] += 1
+    return [
+        (users[index], free[index][part::counts[index]])
+        for index, part in owners
+    ]
+
+
+def run_worker(collection, user, recipe_ids, free_recipes, prefixes, weights,
+               deadline, stats, seed):
+    """Выполняет сценарии до наступления deadline."""
+    rng = random.Random(seed)
+    session = requests.Session()
+    names = list(weights)
+    scenario_weights = [weights[name] for name in names]
+    while time.monotonic() < deadline:
+        scenario = rng.choices(names, weights=scenario_weights)[0]
+        variables = {
+            'userToken': user.token,
+            'firstRecipeId': rng.choice(recipe_ids),
+            'ingredientNameFirstLatter': rng.choice(prefixes),
+        }
+        if scenario in ('toggle_favorite', 'download_cart'):
+            variables['firstRecipeId'] = rng.choice(free_recipes)
+        failed = False
+        for step in SCENARIOS[scenario]:
+            start = time.perf_counter()
+            error = None
+            try:
+                response = collection.send(session, step, variables)
+                status = response.status_code
+                if not 200 <= status < 400:
+                    error = response.text
+            except requests.RequestException as exception:
+                status = 0
+                error = str(exception)
+            stats.add_request(step, time.perf_counter() - start, status, error)
+            if error is not None:
+                failed = True
+                break
+        stats.add_scenario(scenario, failed)
+
+
+def parse_weights(values):
+    weights = dict(DEFAULT_WEIGHTS)
+    for value in values or ():
+        name, _, weight = value.partition('=')
+        if name not in SCENARIOS or not weight.isdigit():
+            raise SystemExit(
+                f'Неверный вес {value!r}; сценарии: {", ".join(SCENARIOS)}'
+            )
+        weights[name] = int(weight)
+    weights = {name: weight for name, weight in weights.items() if weight}
+    if not weights:
+        raise SystemExit('Все сценарии отключены.')
+    return weights
+
+
+def print_report(report):
+    summary = report['summary']
+    print(
+        f'\nЗа {summary["duration_s"]} с: {summary["requests"]} запросов, '
+        f'{summary["rps"]} в секунду, ошибок {summary["errors"]} '
+        f'({summary["error_rate"]:.2%})'
+    )
+    if 'p50_ms' in summary:
+        print(
+            f'p50 {summary["p50_ms"]:.2f} p95 {summary["p95_ms"]:.2f} '
+            f'p99 {summary["p99_ms"]:.2f} мс\n'
+        )
+    for name, result in report['scenarios'].items():
+        print(f'{name:<20} выполнений {result["runs"]:>7}, '
+              f'с ошибкой {result["failed"]}')
+    print()
+    for name, result in report['requests'].items():
+        print(
+            f'{name:<56} {result["rps"]:>8.2f}/с '
+            f'p50 {result["p50_ms"]:>8.2f} p95 {result["p95_ms"]:>8.2f} '
+            f'p99 {result["p99_ms"]:>8.2f} мс, '
+            f'ошибок {result["error_rate"]:.2%}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный прогон сценариев postman-коллекции.'
+    )
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=30,
+        help='Длительность прогона в секундах.'
+    )
+    parser.add_argument(
+        '--users',
+        type=int,
+        help='Сколько пользователей seed_data задействовать; '
+             'по умолчанию по одному на поток.'
+    )
+    parser.add_argument('--username-prefix', default='seed_')
+    parser.add_argument('--password', default='seed-password')
+    parser.add_argument(
+        '--weight',
+        action='append',
+        metavar='СЦЕНАРИЙ=ВЕС',
+        help='Вес сценария, например toggle_favorite=30; '
+             '0 отключает сценарий.'
+    )
+    parser.add_argument(
+        '--recipe-pages',
+        type=int,
+        default=5,
+        help='Сколько страниц списка рецептов взять для выбора id.'
+    )
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--collection', default=str(COLLECTION))
+    parser.add_argument('--output', help='Файл для результатов JSON.')
+    options = parser.parse_args()
+
+    weights = parse_weights(options.weight)
+    collection = Collection(
+        options.collection, options.base_url, options.timeout
+    )
+    session = requests.Session()
+    recipe_ids = []
+    response = collection.send(session, RECIPES, {})
+    for _ in range(options.recipe_pages):
+        response.raise_for_status()
+        data = response.json()
+        recipe_ids.extend(recipe['id'] for recipe in data['results'])
+        if not data['next']:
+            break
+        response = session.get(data['next'], timeout=options.timeout)
+    if not recipe_ids:
+        raise SystemExit('Нет рецептов: создайте данные командой seed_data.')
+    prefixes = sorted({
+        name[:INGREDIENT_PREFIX_LENGTH].lower()
+        for name in collection.collect(session, INGREDIENTS, {}, 'name')
+    })
+    users = [
+        User(
+            collection,
+            session,
+            f'{options.username_prefix}{number}@example.com',
+            options.password
+        )
+        for number in range(options.users or options.concurrency)
+    ]
+
+    assigned = assign_threads(users, recipe_ids, options.concurrency)
+
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + options.duration
+    threads = []
+    for number, (user, recipes) in enumerate(assigned):
+        threads.append(threading.Thread(
+            target=run_worker,
+            args=(
+                collection,
+                user,
+                recipe_ids,
+                recipes,
+                prefixes,
+                weights,
+                deadline,
+                stats,
+                options.seed + number
+            ),
+            daemon=True
+        ))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report = stats.report(time.monotonic() - start)
+    report['meta'] = {
+        'base_url': options.base_url,
+        'concurrency': options.concurrency,
+        'users': len(users),
+        'weights': weights,
+    }
+    print_report(report)
+    if options.output:
+        Path(options.output).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+    return 1 if report['summary']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())